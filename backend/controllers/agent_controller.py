@@ -64,9 +64,9 @@ def get_agent_by_id_endpoint(agent_id: str, db: Session = Depends(get_db)):
             status_code = status.HTTP_200_OK, 
             dependencies = [Depends(require_roles(UserRole.professor, UserRole.admin))],
             responses = update_agent_responses)
-def update_agent_endpoint(agent_id: str, agent_data: AgentUpdate, db: Session = Depends(get_db)):
+async def update_agent_endpoint(agent_id: str, agent_data: AgentUpdate, db: Session = Depends(get_db)):
     try:
-        return update_agent(db, agent_id, agent_data)
+        return await update_agent(db, agent_id, agent_data)
     except AgentNotFoundError as e:
         raise HTTPException(status_code = status.HTTP_404_NOT_FOUND, detail = str(e))
     except IntegrityConstraintError as e:
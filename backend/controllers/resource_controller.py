@@ -1,15 +1,18 @@
-from .responses.resource_responses import create_resource_responses, openapi_extra, get_resource_by_id_responses, delete_resource_responses
-from errors.resource_errors import ResourceNotFoundError, DuplicateResourceError, FileSizeError, FileDeletionError, FolderDeletionError
+from .responses.resource_responses import create_resource_responses, create_resources_responses, openapi_extra, bulk_openapi_extra, get_resource_by_id_responses, delete_resource_responses
+from errors.resource_errors import ResourceNotFoundError, DuplicateResourceError, FileSizeError, FileDeletionError, FolderDeletionError, PartialResourceUploadError
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from schemas.resource_schema import ResourceCreate, ResourceResponse
 from errors.db_errors import IntegrityConstraintError
 from middlewares.jwt_auth import require_roles
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from datetime import datetime, timezone
 from models.user_model import UserRole
 from sqlalchemy.orm import Session
 from config.database import get_db
 from services.resource_service import (
     create_resource,
+    create_resources,
     get_resources,
     get_resource_by_id,
     delete_resource,
@@ -49,6 +52,46 @@ async def create_resource_endpoint(db: Session = Depends(get_db), file: UploadFi
         raise HTTPException(status_code = status.HTTP_409_CONFLICT, detail = str(e))
 
 
+# Create Resources in bulk
+@router.post("/bulk", 
+             response_model = list[ResourceResponse], 
+             status_code = status.HTTP_201_CREATED, 
+             dependencies = [Depends(require_roles(UserRole.professor, UserRole.admin))],
+             responses = create_resources_responses,
+             openapi_extra = bulk_openapi_extra)
+async def create_resources_endpoint(db: Session = Depends(get_db), files: list[UploadFile] = File(...), consumed_by: str = Form(...)):
+
+    timestamp = datetime.now(timezone.utc)
+    resources_data = [
+        ResourceCreate(
+            name = file.filename,
+            filetype = file.content_type,
+            filepath = "",
+            size = 0,
+            timestamp = timestamp,
+            consumed_by = consumed_by,
+            total_docs = len(files)
+        )
+        for file in files
+    ]
+
+    try:
+        resources = await create_resources(db, resources_data, files)
+        return resources
+    except PartialResourceUploadError as e:
+        # Some files were stored and published before one failed: report both parts
+        return JSONResponse(status_code = status.HTTP_207_MULTI_STATUS, content = {
+            "created": jsonable_encoder([ResourceResponse.model_validate(resource) for resource in e.created]),
+            "failed": {"name": e.failed_name, "detail": str(e.error)}
+        })
+    except DuplicateResourceError as e:
+        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = str(e))
+    except FileSizeError as e:
+        raise HTTPException(status_code = status.HTTP_400_BAD_REQUEST, detail = str(e))
+    except IntegrityConstraintError as e:
+        raise HTTPException(status_code = status.HTTP_409_CONFLICT, detail = str(e))
+
+
 # Get All Resources
 @router.get("/", 
             response_model = list[ResourceResponse], 
@@ -16,6 +16,16 @@ create_resource_responses = {
     },
 }
 
+create_resources_responses = {
+    207: {
+        "description": "Bulk upload stopped partway: earlier files were stored and published",
+        "content": {"application/json": {"example":
+            {"created": [r"{resource}"], "failed": {"name": r"{name}", "detail": r"{reason}"}}
+        }},
+    },
+    **create_resource_responses,
+}
+
 get_resource_by_id_responses = {
     404: {
         "description": "Resource not found",
@@ -61,4 +71,22 @@ openapi_extra = {
       }
     }
   }
+}
+
+bulk_openapi_extra = {
+  "requestBody": {
+    "content": {
+      "multipart/form-data": {
+        "schema": {
+          "title": "CreateResourcesBulkRequest",
+          "type": "object",
+          "properties": {
+            "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+            "consumed_by": {"type": "string"}
+          },
+          "required": ["files", "consumed_by"]
+        }
+      }
+    }
+  }
 }
\ No newline at end of file
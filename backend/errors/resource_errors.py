@@ -25,4 +25,11 @@ class FolderDeletionError(Exception):
     def __init__(self, path: str, error: str):
         self.path = path
         self.error = error
-        super().__init__(f"Failed to delete folder at {path}: {error}")
\ No newline at end of file
+        super().__init__(f"Failed to delete folder at {path}: {error}")
+
+class PartialResourceUploadError(Exception):
+    def __init__(self, created: list, failed_name: str, error: Exception):
+        self.created = created
+        self.failed_name = failed_name
+        self.error = error
+        super().__init__(f"Stored {len(created)} resources before {failed_name} failed: {error}")
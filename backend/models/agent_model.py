@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Boolean, Integer, Enum, ForeignKey
+from sqlalchemy import Column, String, Text, Boolean, Integer, Float, Enum, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from config.database import Base
@@ -10,6 +10,11 @@ class LanguageEnum(enum.Enum):
     es = "es"
     en = "en"
 
+# Define retrieval search type enumeration
+class SearchTypeEnum(enum.Enum):
+    similarity = "similarity"
+    mmr = "mmr"
+
 # Define agent model
 class Agent(Base):
     __tablename__ = "agents"
@@ -22,6 +27,9 @@ class Agent(Base):
     model = Column(String(100), nullable = False)
     language = Column(Enum(LanguageEnum), nullable = False)
     retrieval_k = Column(Integer, nullable = False)
+    rerank_top_n = Column(Integer, nullable = False, default = 10)
+    search_type = Column(Enum(SearchTypeEnum), nullable = False, default = SearchTypeEnum.similarity)
+    score_threshold = Column(Float, nullable = True)
     associated_course = Column(UUID(as_uuid = True), ForeignKey("courses.id", ondelete = "CASCADE"), nullable = False)
     
     course = relationship("Course", back_populates = "agents")
@@ -1,7 +1,7 @@
 from .examples.agent_examples import resource_response_example, course_response_example, agent_create_example, agent_update_example, agent_response_example
-from models.agent_model import LanguageEnum
+from models.agent_model import LanguageEnum, SearchTypeEnum
 from typing import Optional, List
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from uuid import UUID
 
 
@@ -41,6 +41,9 @@ class AgentBase(BaseModel):
     model: str
     language: LanguageEnum
     retrieval_k: int
+    rerank_top_n: int = Field(default = 10, ge = 1)
+    search_type: SearchTypeEnum = SearchTypeEnum.similarity
+    score_threshold: Optional[float] = Field(default = None, ge = 0, le = 1)
 
 # Agent Create Schema
 class AgentCreate(AgentBase):
@@ -59,6 +62,9 @@ class AgentUpdate(BaseModel):
     model: Optional[str] = None
     language: Optional[LanguageEnum] = None
     retrieval_k: Optional[int] = None
+    rerank_top_n: Optional[int] = Field(default = None, ge = 1)
+    search_type: Optional[SearchTypeEnum] = None
+    score_threshold: Optional[float] = Field(default = None, ge = 0, le = 1)
     associated_course: Optional[UUID] = None
 
     model_config = {
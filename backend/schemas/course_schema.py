@@ -1,5 +1,5 @@
 from .examples.course_example import course_create_example, course_update_example, course_response_example
-from models.agent_model import LanguageEnum
+from models.agent_model import LanguageEnum, SearchTypeEnum
 from typing import Optional, List
 from pydantic import BaseModel
 from uuid import UUID
@@ -25,6 +25,9 @@ class AgentResponse(BaseModel):
     model: str
     language: LanguageEnum
     retrieval_k: int
+    rerank_top_n: int
+    search_type: SearchTypeEnum
+    score_threshold: Optional[float] = None
 
     model_config = {
         "from_attributes": True
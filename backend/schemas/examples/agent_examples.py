@@ -31,6 +31,9 @@ agent_create_example = {
                 "model": "gpt-4o-mini",
                 "language": "es",
                 "retrieval_k": 25,
+                "rerank_top_n": 8,
+                "search_type": "similarity",
+                "score_threshold": None,
                 "associated_course": UUID_COURSE
             }]
         }
@@ -39,7 +42,9 @@ agent_update_example = {
             "examples": [{
                 "description": "Adds grading rubric guidance",
                 "is_working": False,
-                "retrieval_k": 30
+                "retrieval_k": 30,
+                "search_type": "mmr",
+                "score_threshold": 0.2
             }]
         }
 
@@ -53,6 +58,9 @@ agent_response_example = {
                 "model": "gpt-4o-mini",
                 "language": "es",
                 "retrieval_k": 25,
+                "rerank_top_n": 8,
+                "search_type": "similarity",
+                "score_threshold": None,
                 "associated_course": UUID_COURSE,
                 "course": {
                     "id": UUID_COURSE,
@@ -17,6 +17,23 @@ UPLOAD_DIR = "backend/prompts"
 
 rabbitmq = RabbitMQ()
 
+# Fields read by the deploy worker to configure the agent container
+RETRIEVAL_FIELDS = ("retrieval_k", "rerank_top_n", "search_type", "score_threshold")
+
+
+# Retrieval settings stored next to the agent prompt, shared with the deploy worker
+def _retrieval_settings(agent: Agent) -> str:
+    return json.dumps({
+        "retrieval_k": agent.retrieval_k,
+        "rerank_top_n": agent.rerank_top_n,
+        "search_type": agent.search_type.value,
+        "score_threshold": agent.score_threshold
+    })
+
+
+def _retrieval_settings_path(agent_id) -> str:
+    return os.path.join(UPLOAD_DIR, str(agent_id), "retrieval.json")
+
 
 # Create agent (POST)
 async def create_agent(db: Session, agent_data: AgentCreate):
@@ -36,6 +53,9 @@ async def create_agent(db: Session, agent_data: AgentCreate):
         model = agent_data.model,
         language = agent_data.language,
         retrieval_k = agent_data.retrieval_k,
+        rerank_top_n = agent_data.rerank_top_n,
+        search_type = agent_data.search_type,
+        score_threshold = agent_data.score_threshold,
         associated_course = agent_data.associated_course
     )
     
@@ -54,6 +74,9 @@ async def create_agent(db: Session, agent_data: AgentCreate):
         async with await anyio.open_file(filepath, "w", encoding = "utf-8") as f:
             await f.write(agent.system_prompt)
 
+        async with await anyio.open_file(_retrieval_settings_path(agent_id), "w", encoding = "utf-8") as f:
+            await f.write(_retrieval_settings(agent))
+
         message = {
             "filepath": filepath
         }
@@ -85,7 +108,7 @@ def get_agent_by_id(db: Session, agent_id: str):
 
 
 # Update agent (PUT)
-def update_agent(db: Session, agent_id: str, agent_data: AgentUpdate):
+async def update_agent(db: Session, agent_id: str, agent_data: AgentUpdate):
     logger.info("Updating agent id=%s", agent_id)
     agent = get_agent_by_id(db, agent_id)
     
@@ -95,7 +118,8 @@ def update_agent(db: Session, agent_id: str, agent_data: AgentUpdate):
             logger.warning("Associated course not found id=%s", agent_data.associated_course)
             raise CourseNotFoundError("id", agent_data.associated_course)
 
-    for key, value in agent_data.model_dump(exclude_unset = True).items():
+    changes = agent_data.model_dump(exclude_unset = True)
+    for key, value in changes.items():
         setattr(agent, key, value)
 
     try:
@@ -103,6 +127,22 @@ def update_agent(db: Session, agent_id: str, agent_data: AgentUpdate):
         db.refresh(agent)
         agent = db.query(Agent).options(selectinload(Agent.course)).filter(Agent.id == agent.id).first()
         logger.info("Agent updated successfully id=%s", agent.id)
+
+        # The deploy worker reloads a running agent with the new settings; a stopped one reads them on its next deploy
+        if any(field in changes for field in RETRIEVAL_FIELDS):
+            os.makedirs(os.path.join(UPLOAD_DIR, str(agent.id)), exist_ok = True)
+            async with await anyio.open_file(_retrieval_settings_path(agent.id), "w", encoding = "utf-8") as f:
+                await f.write(_retrieval_settings(agent))
+            logger.info("Retrieval settings updated for agent id=%s", agent.id)
+
+            message = {
+                "event": "settings_updated",
+                "agent_id": str(agent.id)
+            }
+
+            await rabbitmq.publish("deploy", json.dumps(message))
+            logger.info("Settings update published in deploy topic")
+
         return agent
     
     except IntegrityError as e:
@@ -1,4 +1,4 @@
-from errors.resource_errors import ResourceNotFoundError, DuplicateResourceError, FileSizeError, FileDeletionError, FolderDeletionError
+from errors.resource_errors import ResourceNotFoundError, DuplicateResourceError, FileSizeError, FileDeletionError, FolderDeletionError, PartialResourceUploadError
 from errors.db_errors import IntegrityConstraintError
 from schemas.resource_schema import ResourceCreate
 from errors.agent_errors import AgentNotFoundError
@@ -27,8 +27,15 @@ def copy_sync(src_fileobj, dst_path: str):
         shutil.copyfileobj(src_fileobj, out)
         out.flush()
 
-# Create resource (POST)
-async def create_resource(db: Session, resource_data: ResourceCreate, file: UploadFile):
+def _build_file_message(resource: Resource, total_docs: int) -> str:
+    return json.dumps({
+        "filepath": resource.filepath,
+        "total_docs": total_docs
+    })
+
+
+# Save uploaded file and resource row, without publishing it
+async def save_resource(db: Session, resource_data: ResourceCreate, file: UploadFile):
     logger.info("Creating new resource with name=%s", resource_data.name)
     
     # Verify associated agent
@@ -90,9 +97,6 @@ async def create_resource(db: Session, resource_data: ResourceCreate, file: Uplo
     resource_data.filepath = final_path
     resource_data.size = file_size
 
-    # Get total document information
-    total_docs = resource_data.total_docs
-
     # Create model
     resource = Resource(**resource_data.model_dump(exclude = {"total_docs"}))
 
@@ -108,20 +112,64 @@ async def create_resource(db: Session, resource_data: ResourceCreate, file: Uplo
         logger.error("IntegrityError when creating resource: %s", str(e))
         raise IntegrityConstraintError("Create Resource")
 
+    logger.info("Resource created successfully id=%s", resource.id)
+    return resource
+
+
+# Create resource (POST)
+async def create_resource(db: Session, resource_data: ResourceCreate, file: UploadFile):
+    resource = await save_resource(db, resource_data, file)
+
     # Send to RabbitMQ
-    message = {
-        "filepath": resource.filepath,
-        "total_docs": total_docs
-    }
-    
-    await rabbitmq.publish("files", json.dumps(message))
+    await rabbitmq.publish("files", _build_file_message(resource, resource_data.total_docs))
     logger.info("Resource published in files topic")
 
     # Return full resoruce with agent loaded
-    logger.info("Resource created successfully id=%s", resource.id)
     return resource
 
 
+# Create several resources for the same agent (POST)
+async def create_resources(db: Session, resources_data: list[ResourceCreate], files: list[UploadFile]):
+    logger.info("Creating %s resources in bulk", len(files))
+
+    # Reject duplicated names inside the batch before touching the filesystem
+    names = [resource_data.name for resource_data in resources_data]
+    for name in names:
+        if names.count(name) > 1:
+            logger.warning("Resource with name=%s repeated in bulk upload", name)
+            raise DuplicateResourceError(name)
+
+    resources = []
+    for resource_data, file in zip(resources_data, files):
+        try:
+            resources.append(await save_resource(db, resource_data, file))
+        except Exception as e:
+            if not resources:
+                raise
+            logger.warning("Bulk upload stopped at name=%s after storing %s resources", resource_data.name, len(resources))
+            failed_name, error = resource_data.name, e
+            break
+    else:
+        failed_name, error = None, None
+
+    # Already stored resources are published even if a later file failed, and the barrier
+    # only waits for those, so none is left unprocessed
+    try:
+        await rabbitmq.publish_many([
+            ("files", _build_file_message(resource, len(resources)))
+            for resource in resources
+        ])
+    except Exception:
+        if error is None:
+            raise
+        # The upload error is the one reported to the client
+        logger.exception("Could not publish %s stored resources of a partial bulk upload", len(resources))
+    else:
+        logger.info("%s resources published in files topic", len(resources))
+
+    if error is not None:
+        raise PartialResourceUploadError(resources, failed_name, error)
+    return resources
 
 
 # Get all resources (GET)
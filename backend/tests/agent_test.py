@@ -1,3 +1,5 @@
+import asyncio
+import json
 import uuid
 
 from fastapi import HTTPException, status
@@ -106,7 +108,7 @@ def test_get_agent_by_id_unauthorized(client_unauthorized):
 def test_update_agent_success(client_auth_ok, monkeypatch):
     aid = "aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa"
     updated = build_agent({"id": aid, "name": "TA Bot 2"})
-    def fake_update(db, agent_id, data):
+    async def fake_update(db, agent_id, data):
         assert agent_id == aid
         return updated
     monkeypatch.setattr(f"{CTRL}.update_agent", fake_update, raising=False)
@@ -115,8 +117,80 @@ def test_update_agent_success(client_auth_ok, monkeypatch):
     assert r.status_code == status.HTTP_200_OK
     assert_subset({"id": aid, "name": "TA Bot 2"}, r.json())
 
+def test_update_agent_retrieval_settings(client_auth_ok, monkeypatch):
+    aid = "aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa"
+    settings = {"retrieval_k": 20, "rerank_top_n": 5, "search_type": "mmr", "score_threshold": 0.3}
+    updated = build_agent({"id": aid, **settings})
+    async def fake_update(db, agent_id, data):
+        assert data.model_dump(exclude_unset=True, mode="json") == settings
+        return updated
+    monkeypatch.setattr(f"{CTRL}.update_agent", fake_update, raising=False)
+
+    r = client_auth_ok.put(f"/agents/{aid}", json=settings)
+    assert r.status_code == status.HTTP_200_OK
+    assert_subset(settings, r.json())
+
+def test_update_agent_invalid_retrieval_settings(client_auth_ok):
+    for payload in ({"search_type": "keyword"}, {"score_threshold": 1.5}, {"rerank_top_n": 0}):
+        r = client_auth_ok.put("/agents/aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa", json=payload)
+        assert r.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+class _FakeDB:
+    """Session stub for update_agent: every query resolves to the given agent."""
+    def __init__(self, agent):
+        self.agent = agent
+    def commit(self): pass
+    def refresh(self, obj): pass
+    def query(self, model): return self
+    def options(self, *args): return self
+    def filter(self, *args): return self
+    def first(self): return self.agent
+
+def _stub_update_service(monkeypatch, tmp_path, agent):
+    # Writes settings under tmp_path and records what gets published
+    from services import agent_service
+
+    published = []
+    async def fake_publish(queue, message):
+        published.append((queue, json.loads(message)))
+
+    monkeypatch.setattr(agent_service, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(agent_service, "get_agent_by_id", lambda db, agent_id: agent)
+    monkeypatch.setattr(agent_service.rabbitmq, "publish", fake_publish)
+    return published
+
+def test_update_agent_writes_retrieval_settings(monkeypatch, tmp_path):
+    from services import agent_service
+    from models.agent_model import Agent, SearchTypeEnum
+
+    aid = uuid.UUID("aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa")
+    agent = Agent(id=aid, retrieval_k=15, rerank_top_n=10, search_type=SearchTypeEnum.similarity)
+
+    published = _stub_update_service(monkeypatch, tmp_path, agent)
+
+    asyncio.run(agent_service.update_agent(_FakeDB(agent), str(aid), AgentUpdate(retrieval_k=25, search_type="mmr", score_threshold=0.2)))
+
+    settings = json.loads((tmp_path / str(aid) / "retrieval.json").read_text(encoding="utf-8"))
+    assert settings == {"retrieval_k": 25, "rerank_top_n": 10, "search_type": "mmr", "score_threshold": 0.2}
+    # The deploy worker reloads the running agent with the new settings
+    assert published == [("deploy", {"event": "settings_updated", "agent_id": str(aid)})]
+
+def test_update_agent_without_retrieval_changes_keeps_settings(monkeypatch, tmp_path):
+    from services import agent_service
+    from models.agent_model import Agent, SearchTypeEnum
+
+    aid = uuid.UUID("aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa")
+    agent = Agent(id=aid, retrieval_k=15, rerank_top_n=10, search_type=SearchTypeEnum.similarity)
+
+    published = _stub_update_service(monkeypatch, tmp_path, agent)
+
+    asyncio.run(agent_service.update_agent(_FakeDB(agent), str(aid), AgentUpdate(name="TA Bot 3")))
+
+    assert not (tmp_path / str(aid) / "retrieval.json").exists()
+    assert published == []
+
 def test_update_agent_not_found(client_auth_ok, monkeypatch):
-    def fake_update(db, agent_id, data):
+    async def fake_update(db, agent_id, data):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="not found")
     monkeypatch.setattr(f"{CTRL}.update_agent", fake_update, raising=False)
 
@@ -124,7 +198,7 @@ def test_update_agent_not_found(client_auth_ok, monkeypatch):
     assert r.status_code == status.HTTP_404_NOT_FOUND
 
 def test_update_agent_integrity(client_auth_ok, monkeypatch):
-    def fake_update(db, agent_id, data):
+    async def fake_update(db, agent_id, data):
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="constraint")
     monkeypatch.setattr(f"{CTRL}.update_agent", fake_update, raising=False)
 
@@ -44,6 +44,7 @@ if "config.rabbitmq" not in sys.modules:
     class DummyRabbitMQ:
         def __init__(self, *a, **k): ...
         def publish(self, *a, **k): ...
+        def publish_many(self, *a, **k): ...
         def consume(self, *a, **k): ...
         def close(self): ...
 
@@ -1,5 +1,8 @@
 import typing
+import asyncio
 import datetime
+import json
+import types
 import enum
 import uuid
 
@@ -7,9 +10,11 @@ import pytest
 from fastapi import HTTPException, status
 from pydantic import BaseModel
 
+from errors.resource_errors import DuplicateResourceError, FileSizeError, PartialResourceUploadError
 from _test_utils import build_resource, assert_subset
 
 CTRL = "controllers.resource_controller"
+SVC = "services.resource_service"
 
 class _PermissiveResourceCreate(BaseModel):
     name: str
@@ -29,6 +34,14 @@ def _multipart_payload():
     }
     return files, data
 
+def _bulk_multipart_payload():
+    files = [
+        ("files", ("syllabus.pdf", b"\x00\x01\x02", "application/pdf")),
+        ("files", ("slides.pdf", b"\x03\x04\x05", "application/pdf")),
+    ]
+    data = {"consumed_by": "course"}
+    return files, data
+
 
 #def test_create_resource_success(client_auth_ok, monkeypatch):
 #    monkeypatch.setattr(f"{CTRL}.ResourceCreate", _PermissiveResourceCreate, raising=False)
@@ -90,6 +103,113 @@ def test_create_resource_unauthorized(client_unauthorized):
     r = client_unauthorized.post("/resources/", files=files, data=data)
     assert r.status_code == status.HTTP_401_UNAUTHORIZED
 
+def test_create_resources_bulk_success(client_auth_ok, monkeypatch):
+    monkeypatch.setattr(f"{CTRL}.ResourceCreate", _PermissiveResourceCreate, raising=False)
+    a = build_resource({"id": "aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa", "name": "syllabus.pdf"})
+    b = build_resource({"id": "bbbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbb", "name": "slides.pdf"})
+    async def fake_create_many(db, resources_data, files):
+        assert [f.filename for f in files] == ["syllabus.pdf", "slides.pdf"]
+        assert [d.name for d in resources_data] == ["syllabus.pdf", "slides.pdf"]
+        assert all(d.total_docs == 2 for d in resources_data)
+        return [a, b]
+    monkeypatch.setattr(f"{CTRL}.create_resources", fake_create_many, raising=False)
+
+    files, data = _bulk_multipart_payload()
+    r = client_auth_ok.post("/resources/bulk", files=files, data=data)
+    assert r.status_code == status.HTTP_201_CREATED
+    body = r.json()
+    assert [item["name"] for item in body] == ["syllabus.pdf", "slides.pdf"]
+
+def test_create_resources_bulk_duplicate(client_auth_ok, monkeypatch):
+    monkeypatch.setattr(f"{CTRL}.ResourceCreate", _PermissiveResourceCreate, raising=False)
+    async def fake_create_many(db, resources_data, files):
+        raise DuplicateResourceError("slides.pdf")
+    monkeypatch.setattr(f"{CTRL}.create_resources", fake_create_many, raising=False)
+
+    files, data = _bulk_multipart_payload()
+    r = client_auth_ok.post("/resources/bulk", files=files, data=data)
+    assert r.status_code == status.HTTP_400_BAD_REQUEST
+    assert "slides.pdf" in r.json()["detail"]
+
+def test_create_resources_bulk_partial(client_auth_ok, monkeypatch):
+    monkeypatch.setattr(f"{CTRL}.ResourceCreate", _PermissiveResourceCreate, raising=False)
+    a = build_resource({"id": "aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa", "name": "syllabus.pdf"})
+    async def fake_create_many(db, resources_data, files):
+        raise PartialResourceUploadError([a], "slides.pdf", FileSizeError(200, 100))
+    monkeypatch.setattr(f"{CTRL}.create_resources", fake_create_many, raising=False)
+
+    files, data = _bulk_multipart_payload()
+    r = client_auth_ok.post("/resources/bulk", files=files, data=data)
+    assert r.status_code == status.HTTP_207_MULTI_STATUS
+    body = r.json()
+    assert [item["name"] for item in body["created"]] == ["syllabus.pdf"]
+    assert body["failed"]["name"] == "slides.pdf"
+    assert "exceeds" in body["failed"]["detail"]
+
+def _stub_bulk_service(monkeypatch, fail_on=None):
+    # Stores every file except fail_on and records what gets published
+    published = []
+    async def fake_save(db, resource_data, file):
+        if resource_data.name == fail_on:
+            raise FileSizeError(200, 100)
+        return types.SimpleNamespace(name=resource_data.name, filepath=f"backend/data/{resource_data.name}")
+    async def fake_publish_many(messages):
+        published.extend(messages)
+    monkeypatch.setattr(f"{SVC}.save_resource", fake_save)
+    monkeypatch.setattr(f"{SVC}.rabbitmq.publish_many", fake_publish_many)
+    return published
+
+def _bulk_data(*names):
+    return [types.SimpleNamespace(name=name) for name in names], [object() for _ in names]
+
+def test_create_resources_service_rejects_duplicate_in_batch(monkeypatch):
+    from services.resource_service import create_resources
+    published = _stub_bulk_service(monkeypatch)
+
+    with pytest.raises(DuplicateResourceError):
+        asyncio.run(create_resources(None, *_bulk_data("a.pdf", "b.pdf", "a.pdf")))
+    assert published == []
+
+def test_create_resources_service_partial_failure_publishes_stored(monkeypatch):
+    from services.resource_service import create_resources
+    published = _stub_bulk_service(monkeypatch, fail_on="c.pdf")
+
+    with pytest.raises(PartialResourceUploadError) as exc:
+        asyncio.run(create_resources(None, *_bulk_data("a.pdf", "b.pdf", "c.pdf", "d.pdf")))
+    assert [r.name for r in exc.value.created] == ["a.pdf", "b.pdf"]
+    assert exc.value.failed_name == "c.pdf"
+    assert isinstance(exc.value.error, FileSizeError)
+    assert [json.loads(body)["total_docs"] for _, body in published] == [2, 2]
+
+def test_create_resources_service_first_failure_raises_original(monkeypatch):
+    from services.resource_service import create_resources
+    published = _stub_bulk_service(monkeypatch, fail_on="a.pdf")
+
+    with pytest.raises(FileSizeError):
+        asyncio.run(create_resources(None, *_bulk_data("a.pdf", "b.pdf")))
+    assert published == []
+
+def test_create_resources_service_publish_error_keeps_upload_error(monkeypatch):
+    from services.resource_service import create_resources
+    _stub_bulk_service(monkeypatch, fail_on="b.pdf")
+    async def failing_publish_many(messages):
+        raise ConnectionError("broker down")
+    monkeypatch.setattr(f"{SVC}.rabbitmq.publish_many", failing_publish_many)
+
+    with pytest.raises(PartialResourceUploadError) as exc:
+        asyncio.run(create_resources(None, *_bulk_data("a.pdf", "b.pdf")))
+    assert isinstance(exc.value.error, FileSizeError)
+
+def test_create_resources_bulk_forbidden(client_forbidden):
+    files, data = _bulk_multipart_payload()
+    r = client_forbidden.post("/resources/bulk", files=files, data=data)
+    assert r.status_code == status.HTTP_403_FORBIDDEN
+
+def test_create_resources_bulk_unauthorized(client_unauthorized):
+    files, data = _bulk_multipart_payload()
+    r = client_unauthorized.post("/resources/bulk", files=files, data=data)
+    assert r.status_code == status.HTTP_401_UNAUTHORIZED
+
 def test_get_resources_success(client_auth_ok, monkeypatch):
     a = build_resource({"id": "aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa", "name": "Syllabus"})
     b = build_resource({"id": "bbbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbb", "name": "Slides"})
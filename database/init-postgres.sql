@@ -47,6 +47,9 @@ CREATE TABLE agents (
     model VARCHAR(100) NOT NULL,
     language VARCHAR(20) NOT NULL CHECK (language IN ('es', 'en')),
     retrieval_k INT NOT NULL,
+    rerank_top_n INT NOT NULL DEFAULT 10,
+    search_type VARCHAR(20) NOT NULL DEFAULT 'similarity' CHECK (search_type IN ('similarity', 'mmr')),
+    score_threshold REAL,
     associated_course UUID NOT NULL,
     CONSTRAINT fk_associated_course FOREIGN KEY (associated_course) REFERENCES courses (id) ON DELETE CASCADE
 );
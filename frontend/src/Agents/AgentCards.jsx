@@ -85,8 +85,8 @@ function AddAgentModal({ show, onHide, courseName, courseCode, courseId, setAgen
             throw new Error(data.error || 'Failed to create agent');
         }
         setAgents((prev) => [data, ...prev]);
-        for (const file of resources) {
-            await uploadFiles(file, data.id, resources.length);
+        if (resources.length > 0) {
+            await uploadFiles(resources, data.id);
         }
         setResources([]);
     } catch (error) {
@@ -95,12 +95,12 @@ function AddAgentModal({ show, onHide, courseName, courseCode, courseId, setAgen
 
   };
 
-  async function uploadFiles(file, agent_id, docs) {
+  async function uploadFiles(files, agent_id) {
     const formData = new FormData();
-    formData.append("file", file, file.name);
-    formData.append("name", file.name);
+    for (const file of files) {
+      formData.append("files", file, file.name);
+    }
     formData.append("consumed_by", String(agent_id));
-    formData.append("total_docs", String(docs));
 
     try{
         const headers = {
@@ -108,7 +108,7 @@ function AddAgentModal({ show, onHide, courseName, courseCode, courseId, setAgen
         };
         console.log(formData);
 
-        const response = await fetch('api/resources/', {
+        const response = await fetch('api/resources/bulk', {
             method: 'POST',
             headers,
             body: formData
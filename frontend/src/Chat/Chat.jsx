@@ -39,15 +39,47 @@ export default function Chat() {
         'Authorization': `Bearer ${accessToken}`,
       };
 
-      const response = await fetch(`/agent/ask?agentID=${agentID}`, {
+      // Las fuentes llegan primero y luego la respuesta token a token (Server-Sent Events)
+      const response = await fetch(`/agent/ask/stream?agentID=${agentID}`, {
         method: 'POST',
         headers,
         body: JSON.stringify({ question: input }),
       });
-      const data = await response.json();
-      console.log('Prueba ', data)
+      if (!response.ok || !response.body) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+
       // @ts-ignore
-      setMessages(prevMessages => [...prevMessages, { from: 'bot', text: data.answer }]);
+      setMessages(prevMessages => [...prevMessages, { from: 'bot', text: '' }]);
+      const updateAnswer = (text) => {
+        // @ts-ignore
+        setMessages(prevMessages => [...prevMessages.slice(0, -1), { from: 'bot', text }]);
+      };
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let answer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Cada evento termina con una línea vacía; el último fragmento puede estar incompleto
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const raw of events) {
+          const { event, data } = parseEvent(raw);
+          if (event === 'sources') {
+            console.log('Fuentes ', data.sources);
+          } else if (event === 'token') {
+            answer += data.text;
+            updateAnswer(answer);
+          } else if (event === 'error') {
+            throw new Error(data.detail);
+          }
+        }
+      }
     } catch (error) {
       console.error('Error:', error);
     }
@@ -155,6 +187,16 @@ export default function Chat() {
   );
 }
 
+function parseEvent(raw) {
+  let event = 'message';
+  const data = [];
+  for (const line of raw.split('\n')) {
+    if (line.startsWith('event:')) event = line.slice(6).trim();
+    else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+  }
+  return { event, data: data.length ? JSON.parse(data.join('\n')) : {} };
+}
+
 function TextBox(input, handleSend, setInput, handleReload, started, agentName) {
   const inputRef = useRef(null);
 
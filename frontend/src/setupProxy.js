@@ -2,6 +2,9 @@
 const { createProxyMiddleware } = require('http-proxy-middleware');
 const { parse } = require('url');
 
+// Servidor multi-agente (perfil multitenant, p. ej. http://agent-server:8000); vacío = un contenedor por agente
+const AGENT_SERVER_URL = process.env.AGENT_SERVER_URL || '';
+
 module.exports = function (app) {
   // API normal
   app.use(
@@ -18,25 +21,31 @@ module.exports = function (app) {
     '/agent',
     createProxyMiddleware({
       // ⬅️ pon aquí el puerto donde escucha tu reverse proxy (80, 8080, 8000, etc.)
-      target: 'http://nginx-proxy:80',
+      target: AGENT_SERVER_URL || 'http://nginx-proxy:80',
       changeOrigin: true,
 
-      // Acepta /agent y /agent/ask; siempre reescribe a /ask (conserva query)
+      // Acepta /agent y /agent/ask (reescribe a /ask) y /agent/ask/stream (reescribe a /ask/stream); conserva query.
+      // Con servidor multi-agente el agente va en la ruta: /agents/<id>/ask y /agents/<id>/ask/stream
       pathRewrite: (path, req) => {
-        const { query } = parse(req.url, true);
+        const { pathname, query } = parse(req.url, true);
         // @ts-ignore
         const search = new URLSearchParams(query);
-        return `/ask${search.toString() ? `?${search.toString()}` : ''}`;
+        let target = pathname && pathname.endsWith('/stream') ? '/ask/stream' : '/ask';
+        if (AGENT_SERVER_URL && query.agentID) {
+          target = `/agents/${encodeURIComponent(query.agentID)}${target}`;
+        }
+        return `${target}${search.toString() ? `?${search.toString()}` : ''}`;
       },
 
-      // Siempre mismo origen; la selección real va por el Host header
-      router: () => 'http://nginx-proxy:80',
+      // Siempre mismo origen; la selección real va por el Host header (los agentes del pool
+      // tienen su ruta en nginx-proxy, la escribe el worker de deploy al asociarlos)
+      router: () => AGENT_SERVER_URL || 'http://nginx-proxy:80',
 
-      // Setea Host para que nginx-proxy/Traefik rote al contenedor correcto
+      // Setea Host para que nginx-proxy/Traefik rote al contenedor correcto (no hace falta con servidor multi-agente)
       onProxyReq: (proxyReq, req) => {
         const { query } = parse(req.url, true);
         const id = query.agentID;
-        if (id) {
+        if (id && !AGENT_SERVER_URL) {
           const vhost = `agent_${id}`;
           proxyReq.setHeader('host', vhost);
         }
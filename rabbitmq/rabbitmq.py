@@ -1,4 +1,5 @@
 import aio_pika
+import asyncio
 import logging
 import os
 
@@ -7,16 +8,31 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(me
 
 class RabbitMQ:
 
-    def __init__(self):
+    def __init__(self, trust_topology: bool | None = None, publisher_confirms: bool | None = None):
         self.user = os.getenv("RABBITMQ_USER")
         self.password = os.getenv("RABBITMQ_PASSWORD")
         self.host = os.getenv("RABBITMQ_HOST")
         self.port = int(os.getenv("RABBITMQ_PORT"))
 
+        # Defaults for consume(), each worker can override them per queue
+        self.max_concurrency = int(os.getenv("RABBITMQ_MAX_CONCURRENCY", "1"))
+        self.prefetch_count = int(os.getenv("RABBITMQ_PREFETCH_COUNT", "0")) or self.max_concurrency
+
         self.connection: aio_pika.RobustConnection | None = None
         self.channel: aio_pika.RobustChannel | None = None
         self.running = True
 
+        # Queues already declared on the current channel; cleared whenever the channel is reopened
+        self.declared_queues: set[str] = set()
+        if trust_topology is None:
+            trust_topology = os.getenv("RABBITMQ_TRUST_TOPOLOGY", "false").lower() == "true"
+        self.trust_topology = trust_topology
+
+        # With confirms every publish waits for the broker ack, a nack or return raises instead of dropping the message
+        if publisher_confirms is None:
+            publisher_confirms = os.getenv("RABBITMQ_PUBLISHER_CONFIRMS", "true").lower() == "true"
+        self.publisher_confirms = publisher_confirms
+
 
     async def connect(self):
         self.connection = await aio_pika.connect_robust(
@@ -26,10 +42,33 @@ class RabbitMQ:
             password = self.password,
             heartbeat = 60
         )
-        self.channel = await self.connection.channel()
+        # on_return_raises: an unroutable message (e.g. a queue missing under trust_topology) raises instead of being confirmed
+        self.channel = await self.connection.channel(
+            publisher_confirms = self.publisher_confirms,
+            on_return_raises = self.publisher_confirms
+        )
+        self.channel.reopen_callbacks.add(self._on_channel_reopen)
+        self.declared_queues.clear()
         logging.info("RabbitMQ connected (async)")
 
 
+    def _on_channel_reopen(self, *args):
+        self.declared_queues.clear()
+        logging.info("RabbitMQ channel reopened, declared queue cache cleared")
+
+
+    def invalidate_queue(self, queue_name: str):
+        self.declared_queues.discard(queue_name)
+
+
+    async def ensure_queue(self, queue_name: str):
+        if self.trust_topology or queue_name in self.declared_queues:
+            return
+
+        await self.channel.declare_queue(queue_name, durable = True)
+        self.declared_queues.add(queue_name)
+
+
     async def close(self):
         self.running = False
         if self.connection and not self.connection.is_closed:
@@ -37,33 +76,88 @@ class RabbitMQ:
         logging.info("RabbitMQ connection closed (async)")
 
 
+    def _build_message(self, message: str) -> aio_pika.Message:
+        return aio_pika.Message(
+            body = message.encode(),
+            delivery_mode = aio_pika.DeliveryMode.PERSISTENT
+        )
+
+
     async def publish(self, queue_name: str, message: str):
         if not self.channel or self.channel.is_closed:
             await self.connect()
         
-        queue = await self.channel.declare_queue(queue_name, durable = True)
+        await self.ensure_queue(queue_name)
         await self.channel.default_exchange.publish(
-            aio_pika.Message(
-                body = message.encode(),
-                delivery_mode = aio_pika.DeliveryMode.PERSISTENT
-            ),
-            routing_key = queue.name
+            self._build_message(message),
+            routing_key = queue_name
         )
         logging.info(f"Sent message to queue {queue_name}: {message}")
 
 
-    async def consume(self, queue_name: str, callback):
+    async def publish_many(self, messages: list[tuple[str, str]]):
+        if not messages:
+            return
+
+        if not self.channel or self.channel.is_closed:
+            await self.connect()
+
+        for queue_name in dict.fromkeys(queue_name for queue_name, _ in messages):
+            await self.ensure_queue(queue_name)
+
+        # All messages are written before waiting, so the confirms arrive in one round trip instead of one per message
+        results = await asyncio.gather(
+            *(
+                self.channel.default_exchange.publish(self._build_message(message), routing_key = queue_name)
+                for queue_name, message in messages
+            ),
+            return_exceptions = True
+        )
+
+        failures = [result for result in results if isinstance(result, Exception)]
+        if failures:
+            logging.error(f"{len(failures)}/{len(messages)} messages were not confirmed by the broker")
+            raise failures[0]
+
+        logging.info(f"Sent {len(messages)} messages to queues {sorted({queue_name for queue_name, _ in messages})}")
+
+
+    async def consume(self, queue_name: str, callback, prefetch_count: int | None = None, max_concurrency: int | None = None):
         if not self.channel or self.channel.is_closed:
             await self.connect()
 
+        max_concurrency = max(1, max_concurrency or self.max_concurrency)
+        prefetch_count = max(prefetch_count or self.prefetch_count, max_concurrency)
+
+        await self.channel.set_qos(prefetch_count = prefetch_count)
         queue = await self.channel.declare_queue(queue_name, durable = True)
-        logging.info(f"[*] Waiting for messages in queue '{queue_name}'...")
+        self.declared_queues.add(queue_name)
+        logging.info(
+            f"[*] Waiting for messages in queue '{queue_name}' "
+            f"(prefetch={prefetch_count}, concurrency={max_concurrency})..."
+        )
 
-        async with queue.iterator() as queue_iter:
-            async for message in queue_iter:
-                async with message.process():
+        semaphore = asyncio.Semaphore(max_concurrency)
+        tasks: set[asyncio.Task] = set()
+
+        async def handle(message):
+            try:
+                async with message.process(ignore_processed = True):
                     try:
                         await callback(message)
                     except Exception as e:
                         logging.error(f"Error processing message: {e}")
                         await message.nack(requeue = True)
+            finally:
+                semaphore.release()
+
+        async with queue.iterator() as queue_iter:
+            async for message in queue_iter:
+                # Backpressure: no new deliveries are dispatched until a slot is free
+                await semaphore.acquire()
+                task = asyncio.create_task(handle(message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions = True)
@@ -5,7 +5,8 @@ import json
 import asyncio
 
 logging.basicConfig(level = logging.INFO, format = "%(asctime)s [%(levelname)s] %(message)s")
-rabbitmq = RabbitMQ()
+# Barrier queues are deleted by BarrierNotifier, so they are never trusted to exist
+rabbitmq = RabbitMQ(trust_topology = False)
 
 notifiers = {}
 
@@ -27,6 +28,7 @@ async def callback(message):
 
         if agent_id not in notifiers or notifiers[agent_id].done():
             logging.info(f"Spawning BarrierNotifier for agent: {agent_id}")
+            rabbitmq.invalidate_queue(agent_id)
             notifiers[agent_id] = asyncio.create_task(
                 BarrierNotifier(agent_id, total_docs).run()
             )
@@ -39,7 +41,8 @@ async def callback(message):
         
 
 async def main():
-    await rabbitmq.consume("control", callback)
+    # One at a time: the callback shares the notifiers dict across messages, whatever RABBITMQ_MAX_CONCURRENCY says
+    await rabbitmq.consume("control", callback, max_concurrency = 1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,204 @@
+from functools import partial
+from pathlib import Path
+import urllib.request
+import logging
+import asyncio
+import anyio
+import json
+import uuid
+
+POOL_PREFIX = "agent_pool_"
+POOL_LABEL = "deploy.role=agent-pool"
+# Copias privadas de la base y el prompt de cada agente dentro del contenedor (ver templates/main.py)
+SNAPSHOTS_DIR = "/app/snapshots"
+
+# Ruta de nginx-proxy a un contenedor del pool: no tiene VIRTUAL_HOST porque arrancó sin agente.
+# El resolver de Docker se consulta en cada request, así la ruta sobrevive a reemplazos del contenedor
+ROUTE_TEMPLATE = """server {{
+    server_name {container_name};
+    listen 80;
+    resolver 127.0.0.11 valid=10s;
+    set $agent_upstream http://{container_name}:8000;
+
+    location / {{
+        proxy_pass $agent_upstream;
+        proxy_http_version 1.1;
+        proxy_set_header Host $http_host;
+        proxy_set_header X-Real-IP $remote_addr;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    }}
+}}
+"""
+
+
+async def docker(*args: str) -> tuple[int, str]:
+    process = await asyncio.create_subprocess_exec(
+        "docker", *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        logging.warning(f"docker {args[0]} failed: {stderr.decode().strip()}")
+    return process.returncode, stdout.decode().strip()
+
+
+def http_json(method: str, url: str, body: dict | None = None, headers: dict | None = None, timeout: float = 5) -> dict:
+    request = urllib.request.Request(
+        url,
+        data = json.dumps(body).encode("utf-8") if body is not None else None,
+        method = method,
+        headers = {"Content-Type": "application/json", **(headers or {})}
+    )
+    with urllib.request.urlopen(request, timeout = timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+class AgentPool:
+    """Contenedores agent-base arrancados de antemano, con los modelos ya cargados y sin agente."""
+
+    def __init__(self, size: int, image: str, network: str, admin_token: str, run_args: list[str], attach_timeout: float,
+                 databases_dir: str, prompts_dir: str, routes_dir: str, proxy_container: str):
+        self.size = size
+        self.image = image
+        self.network = network
+        self.admin_token = admin_token
+        # Variables comunes; sin volúmenes: cada contenedor recibe solo la base y el prompt de su agente
+        self.run_args = run_args
+        self.attach_timeout = attach_timeout
+        # Bases y prompts de todos los agentes, montados en el worker y copiados al contenedor al asociarlo
+        self.databases_dir = Path(databases_dir)
+        self.prompts_dir = Path(prompts_dir)
+        # conf.d de nginx-proxy, compartido con el worker
+        self.routes_dir = Path(routes_dir)
+        self.proxy_container = proxy_container
+        self.lock = asyncio.Lock()
+        self.refill_tasks: set[asyncio.Task] = set()
+
+
+    async def containers(self, all_states: bool = False) -> list[str]:
+        command = ["ps", "-a"] if all_states else ["ps"]
+        code, output = await docker(*command, "--filter", f"name={POOL_PREFIX}", "--format", "{{.Names}}")
+        return output.split() if code == 0 and output else []
+
+
+    async def start_container(self):
+        name = f"{POOL_PREFIX}{uuid.uuid4().hex[:8]}"
+        code, _ = await docker(
+            "run", "-d",
+            "--name", name,
+            "--network", self.network,
+            "--label", POOL_LABEL,
+            "-e", "AGENT_POOL=true",
+            "-e", f"ADMIN_TOKEN={self.admin_token}",
+            *self.run_args,
+            self.image,
+        )
+        if code == 0:
+            logging.info(f"Warm container {name} started")
+
+
+    async def reset(self):
+        # Los contenedores de una ejecución anterior tienen otro token: se reemplazan
+        stale = await self.containers(all_states = True)
+        if stale:
+            await docker("rm", "-f", *stale)
+            logging.info(f"Removed {len(stale)} stale warm containers")
+        await self.fill()
+
+
+    async def fill(self):
+        async with self.lock:
+            missing = self.size - len(await self.containers())
+            for _ in range(missing):
+                await self.start_container()
+
+
+    def refill(self):
+        task = asyncio.create_task(self.fill())
+        self.refill_tasks.add(task)
+        task.add_done_callback(self.refill_tasks.discard)
+
+
+    async def is_ready(self, name: str) -> bool:
+        # Responde cuando terminó de cargar los modelos; agent_id vacío significa que está libre
+        try:
+            status = await anyio.to_thread.run_sync(http_json, "GET", f"http://{name}:8000/")
+        except Exception:
+            return False
+        return status.get("agent_id") is None
+
+
+    async def copy_agent(self, agent_id: str, name: str) -> str | None:
+        # Copia la base y el prompt del agente a un directorio nuevo del contenedor; los demás agentes no se ven desde ahí
+        snapshot = uuid.uuid4().hex[:12]
+        target = f"{SNAPSHOTS_DIR}/{snapshot}"
+        code, _ = await docker("exec", name, "mkdir", "-p", f"{target}/databases", f"{target}/prompts")
+        if code != 0:
+            return None
+        for source, destination in ((self.databases_dir / agent_id, "databases"), (self.prompts_dir / agent_id, "prompts")):
+            code, _ = await docker("cp", str(source), f"{name}:{target}/{destination}/")
+            if code != 0:
+                return None
+        return snapshot
+
+
+    async def admin(self, name: str, path: str, body: dict | None):
+        request = partial(
+            http_json, "POST", f"http://{name}:8000{path}",
+            body, {"X-Admin-Token": self.admin_token}, self.attach_timeout
+        )
+        return await anyio.to_thread.run_sync(request)
+
+
+    async def publish_route(self, container_name: str):
+        route = self.routes_dir / f"{container_name}.conf"
+        async with await anyio.open_file(route, "w") as f:
+            await f.write(ROUTE_TEMPLATE.format(container_name = container_name))
+        await docker("exec", self.proxy_container, "nginx", "-s", "reload")
+
+
+    async def remove_route(self, container_name: str):
+        route = self.routes_dir / f"{container_name}.conf"
+        if route.exists():
+            route.unlink()
+            await docker("exec", self.proxy_container, "nginx", "-s", "reload")
+
+
+    async def claim(self, agent_id: str, container_name: str) -> bool:
+        async with self.lock:
+            for name in await self.containers():
+                if not await self.is_ready(name):
+                    continue
+
+                snapshot = await self.copy_agent(agent_id, name)
+                if snapshot is None:
+                    await docker("rm", "-f", name)
+                    continue
+
+                try:
+                    await self.admin(name, "/admin/attach", {"agent_id": agent_id, "snapshot": snapshot})
+                except Exception as e:
+                    logging.warning(f"Could not attach agent {agent_id} to {name}: {e}")
+                    await docker("rm", "-f", name)
+                    continue
+
+                # El nombre agent_<id> es el que resuelven el proxy y el resto de la red
+                code, _ = await docker("rename", name, container_name)
+                if code != 0:
+                    await docker("rm", "-f", name)
+                    return False
+
+                await self.publish_route(container_name)
+                logging.info(f"Agent {agent_id} attached to warm container {name}")
+                return True
+
+        return False
+
+
+    async def refresh(self, agent_id: str, container_name: str):
+        # Recursos nuevos de un agente del pool: copia fresca y recarga sobre ella, sin reiniciar el contenedor
+        snapshot = await self.copy_agent(agent_id, container_name)
+        if snapshot is None:
+            raise RuntimeError(f"Could not copy agent {agent_id} into {container_name}")
+        await self.admin(container_name, "/admin/reload", {"snapshot": snapshot})
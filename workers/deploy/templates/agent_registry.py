@@ -0,0 +1,258 @@
+from collections import OrderedDict
+from pathlib import Path
+import threading
+import logging
+import json
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Ajustes que el backend guarda en retrieval.json y los argumentos de AgentRuntime que configuran
+RETRIEVAL_SETTINGS = ("retrieval_k", "rerank_top_n", "search_type", "score_threshold")
+
+
+class AgentNotFoundError(Exception):
+    pass
+
+
+def agent_paths(databases_dir, prompts_dir, agent_id: str) -> tuple[Path, Path]:
+    # Solo UUIDs: el id se usa para construir rutas en disco
+    try:
+        agent_id = str(uuid.UUID(agent_id))
+    except ValueError:
+        raise AgentNotFoundError(agent_id)
+    return Path(databases_dir) / agent_id, Path(prompts_dir) / agent_id
+
+
+def load_agent(agent_id: str, databases_dir, prompts_dir, runtime_factory, store_loader):
+    # Prompt y ajustes de recuperación son los que el backend guarda en <prompts_dir>/<agent_id>
+    db_path, prompt_dir = agent_paths(databases_dir, prompts_dir, agent_id)
+    prompt_path = prompt_dir / "prompt.txt"
+    if not db_path.is_dir() or not prompt_path.exists():
+        raise AgentNotFoundError(agent_id)
+
+    settings = {}
+    settings_path = prompt_dir / "retrieval.json"
+    if settings_path.exists():
+        stored = json.loads(settings_path.read_text(encoding = "utf-8"))
+        settings = {key: stored[key] for key in RETRIEVAL_SETTINGS if stored.get(key) is not None}
+
+    vector_store = store_loader(str(db_path))
+    runtime = runtime_factory(
+        agent_id, str(db_path), prompt_path.read_text(encoding = "utf-8"), vector_store, **settings
+    )
+    logger.info("Agente %s abierto (%s)", agent_id, settings or "ajustes por defecto")
+    return runtime
+
+
+class RegisteredAgent:
+
+    def __init__(self, agent_id: str, runtime):
+        self.agent_id = agent_id
+        self.runtime = runtime
+        self.leases = 0
+        self.evicted = False
+
+
+class AgentLease:
+
+    def __init__(self, registry: "AgentRegistry | AgentSlot", entry: RegisteredAgent):
+        self.registry = registry
+        self.entry = entry
+        self.runtime = entry.runtime
+        self.released = False
+
+
+    def release(self):
+        # Idempotente: el stream puede liberar desde el generador y desde la tarea de fondo
+        self.registry.release(self)
+
+
+class AgentRegistry:
+    """Agentes abiertos bajo demanda; los menos usados se cierran al superar max_size."""
+
+    def __init__(self, databases_dir: str, prompts_dir: str, max_size: int, runtime_factory, store_loader):
+        self.databases_dir = Path(databases_dir)
+        self.prompts_dir = Path(prompts_dir)
+        self.max_size = max(1, max_size)
+        self.runtime_factory = runtime_factory
+        self.store_loader = store_loader
+        self.entries: OrderedDict[str, RegisteredAgent] = OrderedDict()
+        # Abrir una base es lento: cada agente tiene su propio lock para no frenar a los demás
+        self.lock = threading.Lock()
+        self.open_locks: dict[str, threading.Lock] = {}
+
+
+    def _open(self, agent_id: str):
+        return load_agent(agent_id, self.databases_dir, self.prompts_dir, self.runtime_factory, self.store_loader)
+
+
+    def _close(self, entry: RegisteredAgent):
+        entry.runtime.close()
+        logger.info("Agente %s cerrado", entry.agent_id)
+
+
+    def _lease(self, entry: RegisteredAgent) -> AgentLease:
+        # Se llama con self.lock tomado
+        self.entries.move_to_end(entry.agent_id)
+        entry.leases += 1
+
+        while len(self.entries) > self.max_size:
+            _, oldest = self.entries.popitem(last = False)
+            oldest.evicted = True
+            if oldest.leases == 0:
+                self._close(oldest)
+        return AgentLease(self, entry)
+
+
+    def acquire(self, agent_id: str) -> AgentLease:
+        # Bloqueante: se llama desde un hilo. Cada acquire debe terminar con un release
+        agent_paths(self.databases_dir, self.prompts_dir, agent_id)
+        with self.lock:
+            entry = self.entries.get(agent_id)
+            if entry is not None:
+                return self._lease(entry)
+            open_lock = self.open_locks.setdefault(agent_id, threading.Lock())
+
+        with open_lock:
+            with self.lock:
+                entry = self.entries.get(agent_id)
+                if entry is not None:
+                    return self._lease(entry)
+            try:
+                entry = RegisteredAgent(agent_id, self._open(agent_id))
+            except Exception:
+                with self.lock:
+                    self.open_locks.pop(agent_id, None)
+                raise
+
+            with self.lock:
+                self.entries[agent_id] = entry
+                self.open_locks.pop(agent_id, None)
+                return self._lease(entry)
+
+
+    def reload(self, agent_id: str, store_loader) -> bool:
+        # Bloqueante: vuelve a abrir un agente abierto con store_loader (una base recién vectorizada).
+        # Las requests en curso terminan con la versión anterior, que se cierra al liberarse.
+        # Si el agente no está abierto no hay nada que recargar: el próximo acquire lo abre desde disco
+        agent_paths(self.databases_dir, self.prompts_dir, agent_id)
+        with self.lock:
+            if agent_id not in self.entries:
+                return False
+            open_lock = self.open_locks.setdefault(agent_id, threading.Lock())
+
+        with open_lock:
+            try:
+                runtime = load_agent(agent_id, self.databases_dir, self.prompts_dir, self.runtime_factory, store_loader)
+            finally:
+                with self.lock:
+                    self.open_locks.pop(agent_id, None)
+
+            with self.lock:
+                previous = self.entries.get(agent_id)
+                if previous is None:
+                    # Desalojado mientras se recargaba
+                    runtime.close()
+                    return False
+                self.entries[agent_id] = RegisteredAgent(agent_id, runtime)
+                previous.evicted = True
+                if previous.leases == 0:
+                    self._close(previous)
+        logger.info("Agente %s recargado", agent_id)
+        return True
+
+
+    def evict(self, agent_id: str) -> bool:
+        # Cierra el agente (al liberarse, si está respondiendo); el próximo acquire lo vuelve a abrir
+        with self.lock:
+            entry = self.entries.pop(agent_id, None)
+            if entry is None:
+                return False
+            entry.evicted = True
+            if entry.leases == 0:
+                self._close(entry)
+        return True
+
+
+    def release(self, lease: AgentLease):
+        with self.lock:
+            if lease.released:
+                return
+            lease.released = True
+            entry = lease.entry
+            entry.leases -= 1
+            # Un agente desalojado o recargado mientras respondía se cierra al liberarlo
+            if entry.evicted and entry.leases == 0:
+                self._close(entry)
+
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "open_agents": len(self.entries),
+                "max_open_agents": self.max_size,
+                "agents": list(self.entries.keys()),
+            }
+
+
+    def close_all(self):
+        with self.lock:
+            for entry in self.entries.values():
+                entry.evicted = True
+                if entry.leases == 0:
+                    self._close(entry)
+            self.entries.clear()
+
+
+class AgentSlot:
+    """El agente de un contenedor de un solo inquilino; se reemplaza sin cortar las requests en curso."""
+
+    def __init__(self, on_close = None):
+        self.entry: RegisteredAgent | None = None
+        self.lock = threading.Lock()
+        # Limpieza adicional al cerrar una versión reemplazada, con su runtime
+        self.on_close = on_close
+
+
+    @property
+    def runtime(self):
+        entry = self.entry
+        return entry.runtime if entry is not None else None
+
+
+    def _close(self, entry: RegisteredAgent):
+        entry.runtime.close()
+        if self.on_close is not None:
+            self.on_close(entry.runtime)
+        logger.info("Versión anterior del agente %s cerrada", entry.agent_id)
+
+
+    def replace(self, runtime):
+        # Las requests nuevas usan runtime; las que tienen un lease terminan con el anterior,
+        # que se cierra cuando se libera el último
+        with self.lock:
+            previous, self.entry = self.entry, RegisteredAgent(runtime.agent_id, runtime)
+            if previous is not None:
+                previous.evicted = True
+                if previous.leases == 0:
+                    self._close(previous)
+
+
+    def acquire(self) -> AgentLease | None:
+        with self.lock:
+            if self.entry is None:
+                return None
+            self.entry.leases += 1
+            return AgentLease(self, self.entry)
+
+
+    def release(self, lease: AgentLease):
+        with self.lock:
+            if lease.released:
+                return
+            lease.released = True
+            entry = lease.entry
+            entry.leases -= 1
+            if entry.evicted and entry.leases == 0:
+                self._close(entry)
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+import numpy as np
+import unicodedata
+import threading
+import logging
+import time
+import re
+
+logger = logging.getLogger(__name__)
+
+# Archivos de Chroma cuyo cambio indica que la base del agente fue modificada
+STORE_FILES = ("chroma.sqlite3", "chroma.sqlite3-wal")
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.strip("¿?¡!.,;: ")
+
+
+def store_version(db_path: str) -> tuple:
+    version = []
+    for name in STORE_FILES:
+        path = Path(db_path) / name
+        if path.exists():
+            stat = path.stat()
+            version.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(version)
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    answer: dict
+    vector: np.ndarray | None
+    expires_at: float
+
+
+@dataclass
+class CacheProbe:
+    key: str
+    version: tuple
+    vector: np.ndarray | None = field(default = None, repr = False)
+
+
+class AnswerCache:
+
+    def __init__(self, db_path: str, max_entries: int, ttl_seconds: float, semantic_threshold: float = 0.0, embed_fn = None):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        # Umbral de similitud coseno; 0 desactiva la capa semántica
+        self.semantic_threshold = semantic_threshold if embed_fn is not None else 0.0
+        self.embed_fn = embed_fn
+
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.version = store_version(db_path)
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+
+    @property
+    def semantic(self) -> bool:
+        return self.enabled and self.semantic_threshold > 0
+
+
+    def _check_version(self) -> tuple:
+        # Cualquier escritura sobre la base invalida todas las respuestas guardadas
+        version = store_version(self.db_path)
+        if version != self.version:
+            if self.entries:
+                logger.info("Base vectorial modificada: se descartan %d respuestas en cache", len(self.entries))
+            self.entries.clear()
+            self.version = version
+        return version
+
+
+    def _expire(self, now: float):
+        expired = [key for key, entry in self.entries.items() if entry.expires_at <= now]
+        for key in expired:
+            del self.entries[key]
+
+
+    def _semantic_match(self, vector: np.ndarray) -> CacheEntry | None:
+        candidates = [entry for entry in self.entries.values() if entry.vector is not None]
+        if not candidates:
+            return None
+        # Los embeddings están normalizados: el producto punto es la similitud coseno
+        scores = np.stack([entry.vector for entry in candidates]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        logger.info("Cache semántica: similitud %.4f con '%s'", scores[best], candidates[best].key)
+        return candidates[best]
+
+
+    def lookup(self, question: str) -> tuple[dict | None, CacheProbe]:
+        key = normalize_question(question)
+        # El embedding se calcula fuera del lock; es lo único costoso de la búsqueda
+        vector = np.asarray(self.embed_fn(question), dtype = np.float32) if self.semantic else None
+
+        with self.lock:
+            probe = CacheProbe(key, self._check_version(), vector)
+            self._expire(time.monotonic())
+
+            entry = self.entries.get(key)
+            if entry is None and vector is not None:
+                entry = self._semantic_match(vector)
+                if entry is not None:
+                    self.semantic_hits += 1
+
+            if entry is None:
+                self.misses += 1
+                return None, probe
+
+            self.hits += 1
+            self.entries.move_to_end(entry.key)
+            return entry.answer, probe
+
+
+    def store(self, probe: CacheProbe, answer: dict):
+        with self.lock:
+            # Una respuesta generada con la base anterior no se guarda
+            if self._check_version() != probe.version:
+                return
+            self.entries[probe.key] = CacheEntry(probe.key, answer, probe.vector, time.monotonic() + self.ttl)
+            self.entries.move_to_end(probe.key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last = False)
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.version = store_version(self.db_path)
+
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
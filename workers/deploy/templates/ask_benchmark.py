@@ -0,0 +1,76 @@
+from pathlib import Path
+import statistics
+import argparse
+import asyncio
+import time
+
+# Mide la latencia de ask_rag con distintas políticas de descomposición sobre la base del agente.
+# Se corre dentro del contenedor, donde están la base y GOOGLE_API_KEY:
+#   docker exec agent_<id> python ask_benchmark.py --questions preguntas.txt --policies always:serial adaptive:parallel
+# Cada política es <QUERY_DECOMPOSITION>:<serial|parallel>. Con --generate se incluye la respuesta de Gemini.
+import main
+import rag
+
+
+def load_questions(path: str) -> list[str]:
+    lines = Path(path).read_text(encoding = "utf-8").splitlines()
+    return [line.strip() for line in lines if line.strip()]
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def run_policy(policy: str, questions: list[str], repeat: int, generate: bool) -> tuple[list[float], int]:
+    mode, _, schedule = policy.partition(":")
+    rag.QUERY_DECOMPOSITION = mode
+    rag.DECOMPOSE_IN_PARALLEL = schedule != "serial"
+
+    latencies = []
+    for _ in range(repeat):
+        for question in questions:
+            start = time.perf_counter()
+            if generate:
+                await rag.ask_rag(question, main.slot.runtime)
+            else:
+                await rag.prepare_rag(question, main.slot.runtime)
+            latencies.append(time.perf_counter() - start)
+
+    decomposed = sum(rag.should_decompose(question) for question in questions)
+    return latencies, decomposed
+
+
+async def run(args):
+    questions = load_questions(args.questions)
+    if not questions:
+        raise SystemExit(f"No questions in {args.questions}")
+
+    # Calienta encoder y cross-encoder para no cargarle la primera llamada a ninguna política
+    await rag.prepare_rag(questions[0], main.slot.runtime)
+
+    print(f"{len(questions)} questions x {args.repeat}, generate={args.generate}")
+    for policy in args.policies:
+        latencies, decomposed = await run_policy(policy, questions, args.repeat, args.generate)
+        print(
+            f"{policy:<20} decomposed {decomposed}/{len(questions)}  "
+            f"mean={statistics.mean(latencies) * 1000:7.0f}ms  "
+            f"p50={percentile(latencies, 0.5) * 1000:7.0f}ms  "
+            f"p95={percentile(latencies, 0.95) * 1000:7.0f}ms"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", required = True, help = "Archivo con una pregunta por línea")
+    parser.add_argument(
+        "--policies", nargs = "+",
+        default = ["always:serial", "always:parallel", "adaptive:serial", "adaptive:parallel", "never"]
+    )
+    parser.add_argument("--repeat", type = int, default = 1)
+    parser.add_argument("--generate", action = "store_true")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
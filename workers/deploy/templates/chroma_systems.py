@@ -0,0 +1,50 @@
+import chromadb
+
+# Recargar una base en caliente depende del estado interno de SharedSystemClient de chromadb
+# (versión fijada en requirements.txt). Si otra versión no lo tiene, la recarga se rechaza con
+# ReloadUnsupportedError y el worker de deploy reemplaza el contenedor en su lugar
+try:
+    from chromadb.api.shared_system_client import SharedSystemClient
+except ImportError:
+    SharedSystemClient = None
+
+SHARED_STATE = ("_refcount_lock", "_identifier_to_system", "_identifier_to_refcount")
+FRESH_CLIENTS_SUPPORTED = SharedSystemClient is not None and all(hasattr(SharedSystemClient, name) for name in SHARED_STATE)
+
+
+class ReloadUnsupportedError(Exception):
+    pass
+
+
+def open_fresh_client(db_path: str):
+    # chromadb comparte un System (con sus índices en memoria) entre los clientes de una misma ruta,
+    # así que abrir otro Chroma no ve lo que el vectorizador escribió después. Se saca el System actual
+    # del cache: los clientes abiertos conservan el suyo y el nuevo vuelve a leer la base desde disco
+    if not FRESH_CLIENTS_SUPPORTED:
+        raise ReloadUnsupportedError(f"chromadb {chromadb.__version__} no permite reabrir {db_path} en caliente")
+    with SharedSystemClient._refcount_lock:
+        SharedSystemClient._identifier_to_system.pop(db_path, None)
+        SharedSystemClient._identifier_to_refcount.pop(db_path, None)
+    return chromadb.PersistentClient(path = db_path)
+
+
+def client_system(client):
+    # System de un cliente, para cerrarlo aunque una recarga lo haya sacado del cache
+    if not FRESH_CLIENTS_SUPPORTED:
+        return None
+    try:
+        return client._system
+    except (AttributeError, KeyError):
+        return None
+
+
+def close_client(client, system):
+    if system is not None and SharedSystemClient._identifier_to_system.get(getattr(client, "_identifier", None)) is not system:
+        # Reemplazado por una recarga: Client.close() liberaría el System del cliente nuevo
+        system.stop()
+        return
+
+    # Client.close() solo existe en versiones recientes de chromadb
+    close = getattr(client, "close", None)
+    if close is not None:
+        close()
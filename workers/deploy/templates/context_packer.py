@@ -0,0 +1,108 @@
+from dataclasses import dataclass, field
+import math
+
+# Separador entre bloques del contexto, el mismo que usaba ask_rag
+SEPARATOR = "\n\n"
+# chunk_overlap del RecursiveCharacterTextSplitter del vectorizador
+CHUNK_OVERLAP = 150
+# Bases vectorizadas sin overlap_chars: solo se fusiona un solapamiento de al menos este largo.
+# Coincidencias más cortas entre secciones distintas ("uno." + ".NET") son casuales, no del splitter
+MIN_OVERLAP_CHARS = CHUNK_OVERLAP // 4
+MAX_OVERLAP_CHARS = 2 * CHUNK_OVERLAP
+
+
+def estimate_tokens(text: str, chars_per_token: float) -> int:
+    # Estimación local: contar con el tokenizador de Gemini exige una llamada a la API
+    return math.ceil(len(text) / chars_per_token)
+
+
+def relevance(doc) -> float:
+    score = doc.metadata.get("relevance_score")
+    return float(score) if score is not None else float("-inf")
+
+
+def merge_overlap(left: str, right: str, overlap: int | None = None) -> str:
+    # Los chunks vecinos de una misma sección comparten el final del anterior con el inicio del siguiente.
+    # overlap es el que registró el vectorizador (overlap_chars); sin él se busca el más largo
+    if overlap is not None:
+        if 0 < overlap <= len(right) and left.endswith(right[:overlap]):
+            return left + right[overlap:]
+        return left + SEPARATOR + right
+
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + SEPARATOR + right
+
+
+@dataclass
+class ContextBlock:
+    source_file: str
+    first_index: int | None
+    last_index: int | None
+    text: str
+    score: float
+    docs: list = field(default_factory = list, repr = False)
+
+
+@dataclass
+class PackedContext:
+    text: str
+    blocks: list[ContextBlock]
+    docs: list
+    tokens: int
+    dropped: int
+
+
+def merge_adjacent(docs) -> list[ContextBlock]:
+    groups: dict[tuple, list] = {}
+    blocks = []
+    for doc in docs:
+        index = doc.metadata.get("chunk_index")
+        if index is None:
+            blocks.append(ContextBlock(doc.metadata.get("source_file", "unknown"), None, None, doc.page_content, relevance(doc), [doc]))
+            continue
+        key = (doc.metadata.get("source_file", "unknown"), doc.metadata.get("source_path"))
+        groups.setdefault(key, []).append(doc)
+
+    for (source_file, _), group in groups.items():
+        group.sort(key = lambda doc: int(doc.metadata["chunk_index"]))
+        block = None
+        for doc in group:
+            index = int(doc.metadata["chunk_index"])
+            if block is not None and index == block.last_index + 1:
+                block.text = merge_overlap(block.text, doc.page_content, doc.metadata.get("overlap_chars"))
+                block.last_index = index
+                block.score = max(block.score, relevance(doc))
+                block.docs.append(doc)
+                continue
+            block = ContextBlock(source_file, index, index, doc.page_content, relevance(doc), [doc])
+            blocks.append(block)
+
+    # Los bloques más relevantes primero, como venían del reranker
+    blocks.sort(key = lambda block: block.score, reverse = True)
+    return blocks
+
+
+def pack_context(docs, token_budget: int, chars_per_token: float = 4.0) -> PackedContext:
+    ranked = sorted(docs, key = relevance, reverse = True)
+
+    selected = []
+    used = 0
+    for doc in ranked:
+        cost = estimate_tokens(doc.page_content + SEPARATOR, chars_per_token)
+        # El más relevante entra siempre, aunque por sí solo supere el presupuesto
+        if token_budget > 0 and selected and used + cost > token_budget:
+            continue
+        selected.append(doc)
+        used += cost
+
+    blocks = merge_adjacent(selected)
+    text = SEPARATOR.join(block.text for block in blocks)
+    return PackedContext(
+        text = text,
+        blocks = blocks,
+        docs = [doc for block in blocks for doc in block.docs],
+        tokens = estimate_tokens(text, chars_per_token),
+        dropped = len(docs) - len(selected)
+    )
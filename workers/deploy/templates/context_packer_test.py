@@ -0,0 +1,30 @@
+from context_packer import SEPARATOR, merge_overlap
+
+
+def test_merge_overlap_short_accidental_match_keeps_separator():
+    left = "Este es el tema uno."
+    right = ".NET es un framework"
+    assert merge_overlap(left, right) == left + SEPARATOR + right
+
+
+def test_merge_overlap_single_letter_match_keeps_separator():
+    left = "Lo que sigue va en la sección a"
+    right = "a continuación se explica"
+    assert merge_overlap(left, right) == left + SEPARATOR + right
+
+
+def test_merge_overlap_recorded_zero_overlap_keeps_separator():
+    assert merge_overlap("tema uno.", ".NET es", 0) == "tema uno." + SEPARATOR + ".NET es"
+
+
+def test_merge_overlap_uses_recorded_overlap():
+    left = "primera parte del texto compartido"
+    right = "texto compartido y lo que sigue"
+    assert merge_overlap(left, right, len("texto compartido")) == "primera parte del texto compartido y lo que sigue"
+
+
+def test_merge_overlap_long_overlap_without_metadata():
+    shared = "una frase larga que el splitter repite entre chunks vecinos"
+    left = "Inicio del documento. " + shared
+    right = shared + " y continúa el texto."
+    assert merge_overlap(left, right) == "Inicio del documento. " + shared + " y continúa el texto."
@@ -1,176 +1,190 @@
-from langchain.retrievers.document_compressors import CrossEncoderReranker
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.output_parsers import PydanticToolsParser
-from langchain_core.prompts import ChatPromptTemplate
-from fastapi import FastAPI, HTTPException
-from langchain_chroma import Chroma
-from pydantic import BaseModel, Field
-import logging
+from rag import AgentRuntime, AskRequest, answer, answer_stream, load_vector_store, reload_vector_store, logger
+from agent_registry import AgentNotFoundError, AgentSlot, load_agent
+from chroma_systems import ReloadUnsupportedError
+from fastapi import FastAPI, HTTPException, Header
+from pydantic import BaseModel
+from pathlib import Path
+import secrets
+import asyncio
+import shutil
+import anyio
 import sys
+import re
 import os
 
-class ParaphrasedQuery(BaseModel):
-    """Has realizado una expansión de la consulta para generar una paráfrasis de una pregunta."""
-
-    paraphrased_query: str = Field(
-        description="Una paráfrasis única de la pregunta original.",
-    )
-
-logging.basicConfig(level = logging.INFO,  format = "%(asctime)s | %(levelname)s | %(message)s")
-logger = logging.getLogger(__name__)
-
-embeddings = HuggingFaceEmbeddings(
-    model_name = "sentence-transformers/all-mpnet-base-v2",
-    model_kwargs = {"device": "cpu"},
-    encode_kwargs = {"normalize_embeddings": True}
-)
-
-hf_cross_encoder = HuggingFaceCrossEncoder(model_name = "BAAI/bge-reranker-v2-m3")
-reranker = CrossEncoderReranker(model = hf_cross_encoder, top_n = 10)
-
+# Agente de un solo inquilino: un contenedor por agente con su base montada en DB_PATH
 
 PROMPT = os.getenv("PROMPT", "")
 DB_PATH = "/app/database/"
+AGENT_ID = os.getenv("AGENT_ID", "default")
 
-SYSTEM_REWRITE = """Eres un asistente útil que genera subconsultas a partir de una sola pregunta del usuario.
-Descompón la pregunta original en partes más pequeñas y específicas, de modo que cada subconsulta capture un aspecto clave de la intención del usuario.
-Si existen varias formas comunes de formular cada parte o sinónimos relevantes, incluye dichas variantes en las subconsultas.
-Si hay siglas o palabras que no conoces, no intentes reformularlas."""
-
-PROMPT_REWRITE = ChatPromptTemplate.from_messages(
-    [
-        ("system", SYSTEM_REWRITE),
-        ("human", "{question}"),
-    ]
-)
+# Contenedor precalentado del pool del worker de deploy: arranca con los modelos cargados y sin agente,
+# y se asocia a uno con POST /admin/attach. No monta datos: el worker copia la base y el prompt del agente
+# a SNAPSHOTS_DIR/<snapshot>/databases/<id> y .../prompts/<id>, y cada recarga trae una copia nueva
+AGENT_POOL = os.getenv("AGENT_POOL", "false").lower() == "true"
+SNAPSHOTS_DIR = Path("/app/snapshots")
+SNAPSHOT_PATTERN = re.compile(r"^[0-9a-f]{8,32}$")
+# Token de /admin/attach y /admin/reload; sin valor los endpoints de administración quedan deshabilitados
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
 app = FastAPI()
 
-prompt = ChatPromptTemplate.from_template(PROMPT)
-
-llm = ChatGoogleGenerativeAI(
-        model = "gemini-2.5-flash",
-        temperature = 0.5,
-    )
-
-llm_with_tools = llm.bind_tools([ParaphrasedQuery])
-query_analizer = PROMPT_REWRITE | llm_with_tools | PydanticToolsParser(tools = [ParaphrasedQuery])
-
 
-def load_vector_store():
-    if not os.path.exists(DB_PATH):
-        logger.warning(f"No se encontró la base de datos en {DB_PATH}")
-        return None
-    return Chroma( 
-        collection_name = "rag_docs",
-        persist_directory = DB_PATH,
-        embedding_function = embeddings
-    )
+def remove_snapshot(runtime: AgentRuntime):
+    # Al cerrar una versión del agente del pool se borra su copia; las bases montadas (modo normal) no se tocan
+    snapshot_dir = Path(runtime.db_path).parents[1]
+    if snapshot_dir.parent == SNAPSHOTS_DIR:
+        shutil.rmtree(snapshot_dir, ignore_errors = True)
 
-vector_store = load_vector_store()
-compression_retriever = None
 
-def create_compression_retriever(vector_store, reranker, k = 15, search_type = "similarity"):
-    logger.info("Creando retriever base con search_type='%s' y k=%d", search_type, k)
+# Las requests toman un lease del agente actual: una recarga lo reemplaza sin cortar las que están en curso
+slot = AgentSlot(on_close = remove_snapshot)
+admin_lock = asyncio.Lock()
 
-    retriever = vector_store.as_retriever(
-        search_type=search_type,
-        search_kwargs={"k": k}
-    )
-
-    logger.info("Creando ContextualCompressionRetriever con reranker %s", reranker.__class__.__name__)
-
-    compression_retriever = ContextualCompressionRetriever(
-        base_compressor=reranker,
-        base_retriever=retriever
-    )
-
-    return compression_retriever
-
-
-if vector_store:
-    compression_retriever = create_compression_retriever(vector_store, reranker)
-    logger.info("DB encontrada: servidor FastAPI listo para recibir requests")
+if AGENT_POOL:
+    logger.info("Contenedor del pool: modelos cargados, esperando /admin/attach")
 else:
-    logger.warning("No hay DB: el servidor no se iniciará")
-    # Aquí hacemos que el contenedor termine automáticamente
-    sys.exit(0)
-
-
-def ask_rag(question: str, prompt, llm, compression_retriever):
-    logger.info("=== Nueva pregunta RAG ===")
-    logger.info("Pregunta: %s", question)
-
-    queries = query_analizer.invoke({"question":question})
-
-    contexts = []
-    for query in queries:
-        logger.info("Pregunta: %s", query)
-        contexts = contexts + compression_retriever.invoke(query.paraphrased_query)
-    
-    contexts = contexts + compression_retriever.invoke(question)
+    vector_store = load_vector_store(DB_PATH)
 
-    seen = set()
-    unique_contexts = []
-    for doc in contexts:
-        if doc.page_content not in seen:
-            seen.add(doc.page_content)
-            unique_contexts.append(doc)
+    if vector_store:
+        # Ajustes de recuperación por agente: RETRIEVAL_K, RERANK_TOP_N, SEARCH_TYPE y SCORE_THRESHOLD (ver rag.py)
+        slot.replace(AgentRuntime(AGENT_ID, DB_PATH, PROMPT, vector_store))
+        logger.info("DB encontrada: servidor FastAPI listo para recibir requests")
+    else:
+        logger.warning("No hay DB: el servidor no se iniciará")
+        # Aquí hacemos que el contenedor termine automáticamente
+        sys.exit(0)
 
-    contexts = unique_contexts
 
-    logger.info("Documentos unicos recuperados: %d", len(contexts))
-
-    for i, doc in enumerate(contexts, start=1):
-        score = doc.metadata.get("relevance_score", "N/A")
-        snippet = doc.page_content[:200].replace("\n", " ")
-        logger.info("Doc #%d (score=%s, source=%s): %s...", 
-                    i, score, doc.metadata.get("source_file", "unknown"), snippet)
-
-    for i, doc in enumerate(contexts, start=1):
-        snippet = doc.page_content[:200].replace("\n", " ")
-        logger.debug("Doc #%d (source=%s): %s...", 
-                     i, doc.metadata.get("source_file", "unknown"), snippet)
-
-    # Construir contexto
-    docs_content = "\n\n".join(doc.page_content for doc in contexts)
-
-    messages = prompt.invoke({
-        "question": question,
-        "context": docs_content
-    })
-    response = llm.invoke(messages)
-
-    logger.info("Respuesta generada con longitud %d caracteres", len(response.content))
-
-    return {
-        "question": question,
-        "answer": response.content,
-        "sources": [doc.metadata.get("source_file", "unknown") for doc in contexts]
-    }
+def acquire_agent():
+    lease = slot.acquire()
+    if lease is None:
+        raise HTTPException(
+            status_code = 503,
+            detail = "El contenedor aún no tiene un agente asociado"
+        )
+    return lease
+
+
+def check_admin_token(token: str):
+    if not ADMIN_TOKEN or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code = 403, detail = "Forbidden")
+
+
+class RetrievalSettings(BaseModel):
+    # Los de retrieval.json; score_threshold en null desactiva el umbral
+    retrieval_k: int
+    rerank_top_n: int
+    search_type: str
+    score_threshold: float | None = None
+
+
+def open_agent(agent_id: str, snapshot: str | None = None, settings: RetrievalSettings | None = None) -> AgentRuntime:
+    # Bloqueante: abre una base nueva de Chroma con los modelos ya cargados en el proceso
+    if AGENT_POOL:
+        # Cada copia vive en su propio directorio, así que abrirla no reutiliza el System de chromadb de la anterior.
+        # Los ajustes se leen del retrieval.json de la copia
+        snapshot_dir = SNAPSHOTS_DIR / snapshot
+        return load_agent(agent_id, snapshot_dir / "databases", snapshot_dir / "prompts", AgentRuntime, load_vector_store)
+
+    vector_store = reload_vector_store(DB_PATH)
+    if vector_store is None:
+        raise AgentNotFoundError(agent_id)
+    # Sin ajustes en la recarga se mantienen los de las variables de docker run (RETRIEVAL_K, ...)
+    return AgentRuntime(agent_id, DB_PATH, PROMPT, vector_store, **(settings.model_dump() if settings is not None else {}))
+
+
+def check_snapshot(snapshot: str | None):
+    # Solo nombres generados por el worker: el valor se usa para construir rutas en disco
+    if snapshot is None or not SNAPSHOT_PATTERN.match(snapshot):
+        raise HTTPException(status_code = 400, detail = "snapshot inválido")
+
+
+class AttachRequest(BaseModel):
+    agent_id: str
+    snapshot: str
+
+
+class ReloadRequest(BaseModel):
+    snapshot: str | None = None
+    settings: RetrievalSettings | None = None
+
+
+@app.post("/admin/attach")
+async def attach(req: AttachRequest, x_admin_token: str = Header(default = "")):
+    if not AGENT_POOL:
+        raise HTTPException(status_code = 403, detail = "Forbidden")
+    check_admin_token(x_admin_token)
+    check_snapshot(req.snapshot)
+    async with admin_lock:
+        agent = slot.runtime
+        if agent is not None:
+            if agent.agent_id == req.agent_id:
+                return {"agent_id": agent.agent_id, "status": "attached"}
+            raise HTTPException(status_code = 409, detail = f"El contenedor ya está asociado al agente {agent.agent_id}")
+
+        try:
+            # Abrir Chroma lee disco: se hace en un hilo para no bloquear el event loop
+            slot.replace(await anyio.to_thread.run_sync(open_agent, req.agent_id, req.snapshot))
+        except AgentNotFoundError:
+            raise HTTPException(status_code = 404, detail = f"No hay base o prompt para el agente {req.agent_id}")
+
+    logger.info("Contenedor asociado al agente %s", req.agent_id)
+    return {"agent_id": req.agent_id, "status": "attached"}
+
+
+@app.post("/admin/reload")
+async def reload(req: ReloadRequest | None = None, x_admin_token: str = Header(default = "")):
+    # El worker de deploy la llama cuando el vectorizador terminó recursos nuevos de un agente ya desplegado.
+    # Vuelve a abrir la base con los ajustes de recuperación actuales (en el pool, la copia nueva con prompt y ajustes);
+    # los modelos y el contenedor se mantienen
+    check_admin_token(x_admin_token)
+    snapshot = req.snapshot if req is not None else None
+    settings = req.settings if req is not None else None
+    if AGENT_POOL:
+        check_snapshot(snapshot)
+    async with admin_lock:
+        agent = slot.runtime
+        if agent is None:
+            raise HTTPException(status_code = 409, detail = "El contenedor aún no tiene un agente asociado")
+
+        try:
+            refreshed = await anyio.to_thread.run_sync(open_agent, agent.agent_id, snapshot, settings)
+        except AgentNotFoundError:
+            raise HTTPException(status_code = 404, detail = f"No hay base o prompt para el agente {agent.agent_id}")
+        except ReloadUnsupportedError as e:
+            # El worker de deploy reemplaza el contenedor cuando la recarga falla
+            raise HTTPException(status_code = 501, detail = str(e))
+        slot.replace(refreshed)
+
+    logger.info("Base del agente %s recargada", refreshed.agent_id)
+    return {"agent_id": refreshed.agent_id, "status": "reloaded"}
 
 
-class AskRequest(BaseModel):
-    question: str
+@app.post("/ask")
+async def ask(req: AskRequest):
+    lease = acquire_agent()
+    try:
+        return await answer(req.question, lease.runtime)
+    finally:
+        lease.release()
 
 
-@app.post("/ask")
-def ask(req: AskRequest):
-    if compression_retriever is None:
-        raise HTTPException(
-            status_code = 500,
-            detail = "No hay base de datos cargada, el retriever no está inicializado"
-        )
+@app.post("/ask/stream")
+async def ask_stream(req: AskRequest):
+    lease = acquire_agent()
     try:
-        result = ask_rag(req.question, prompt, llm, compression_retriever)
-        return result
-    except Exception as e:
-        raise HTTPException(status_code = 500, detail = str(e))
+        # El agente se libera cuando termina el stream, no al devolver la respuesta
+        return await answer_stream(req.question, lease.runtime, on_close = lease.release)
+    except Exception:
+        lease.release()
+        raise
 
 
 @app.get("/")
 def root():
-    return {"message": "Agente RAG con Chroma corriendo 🚀"}
+    agent = slot.runtime
+    return {
+        "message": "Agente RAG con Chroma corriendo 🚀",
+        "agent_id": agent.agent_id if agent is not None else None
+    }
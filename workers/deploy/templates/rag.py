@@ -0,0 +1,513 @@
+from langchain.retrievers.document_compressors import CrossEncoderReranker
+from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+from langchain.retrievers import ContextualCompressionRetriever
+from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain.output_parsers import PydanticToolsParser
+from langchain_core.prompts import ChatPromptTemplate
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from fastapi import HTTPException
+from langchain_chroma import Chroma
+from pydantic import BaseModel, Field
+from answer_cache import AnswerCache
+from context_packer import pack_context
+from chroma_systems import client_system, close_client, open_fresh_client
+import logging
+import asyncio
+import json
+import anyio
+import os
+
+# Modelos y pipeline RAG compartidos por el agente de un solo inquilino (main.py)
+# y el servidor multi-agente (tenant_server.py): los modelos se cargan una vez por proceso
+
+class ParaphrasedQuery(BaseModel):
+    """Has realizado una expansión de la consulta para generar una paráfrasis de una pregunta."""
+
+    paraphrased_query: str = Field(
+        description="Una paráfrasis única de la pregunta original.",
+    )
+
+logging.basicConfig(level = logging.INFO,  format = "%(asctime)s | %(levelname)s | %(message)s")
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+# torch (por defecto), onnx u onnx-int8: mismo modelo que usó el vectorizador, los vectores son compatibles
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_qint8_avx512_vnni.onnx"),
+}
+
+
+def embedding_model_kwargs(backend: str) -> dict:
+    if backend == "torch":
+        return {"device": "cpu"}
+    if backend not in ONNX_FILES:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+    return {"device": "cpu", "backend": "onnx", "model_kwargs": {"file_name": ONNX_FILES[backend]}}
+
+
+embeddings = HuggingFaceEmbeddings(
+    model_name = EMBEDDING_MODEL,
+    model_kwargs = embedding_model_kwargs(EMBEDDING_BACKEND),
+    encode_kwargs = {"normalize_embeddings": True}
+)
+logger.info("Embeddings cargados con backend %s", EMBEDDING_BACKEND)
+
+# Ajustes de recuperación por defecto; cada agente puede sobrescribirlos
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "15"))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "10"))
+SEARCH_TYPE = os.getenv("SEARCH_TYPE", "similarity")
+# Puntaje mínimo del cross-encoder (0-1) para que un chunk llegue al contexto; vacío lo desactiva
+SCORE_THRESHOLD = float(os.getenv("SCORE_THRESHOLD")) if os.getenv("SCORE_THRESHOLD") else None
+
+hf_cross_encoder = HuggingFaceCrossEncoder(model_name = "BAAI/bge-reranker-v2-m3")
+
+# Máximo de subconsultas recuperadas en paralelo por pregunta
+RETRIEVAL_FANOUT = int(os.getenv("RETRIEVAL_FANOUT", "4"))
+retrieval_executor = ThreadPoolExecutor(max_workers = max(1, RETRIEVAL_FANOUT), thread_name_prefix = "retrieval")
+
+# union: candidatos de todas las subconsultas, deduplicados y reordenados en una sola pasada del cross-encoder.
+# per_query: cada subconsulta se reordena por separado (comportamiento original).
+RERANK_MODE = os.getenv("RERANK_MODE", "union")
+
+# En modo union todas las consultas se embeben en un solo llamado al encoder
+BATCH_QUERY_EMBEDDING = os.getenv("BATCH_QUERY_EMBEDDING", "true").lower() == "true"
+
+# Preguntas atendidas a la vez; por encima del límite se responde 503 con Retry-After en lugar de encolar
+MAX_IN_FLIGHT_ASKS = int(os.getenv("MAX_IN_FLIGHT_ASKS", "16"))
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+
+# always: toda pregunta pasa por query_analizer antes de recuperar (comportamiento original).
+# adaptive: las preguntas cortas o simples van directo a la recuperación. never: nunca se descompone.
+QUERY_DECOMPOSITION = os.getenv("QUERY_DECOMPOSITION", "adaptive")
+DECOMPOSE_MIN_WORDS = int(os.getenv("DECOMPOSE_MIN_WORDS", "14"))
+# Recupera la pregunta original mientras Gemini genera las subconsultas
+DECOMPOSE_IN_PARALLEL = os.getenv("DECOMPOSE_IN_PARALLEL", "true").lower() == "true"
+# Indicios de preguntas compuestas o comparativas, que sí se benefician de la descomposición.
+# En español y en inglés, los dos idiomas de los agentes ("compar", " vs" y "versus" cubren ambos)
+MULTI_PART_MARKERS = (
+    "diferencia", "compar", "ventaja", "desventaja", " vs", "versus", "además", "por otro lado", ";",
+    "differ", "advantage", "pros and cons", "contrast", "in addition", "on the other hand"
+)
+
+# Tokens de contexto enviados a Gemini: los chunks entran por relevance_score hasta el presupuesto (0 = sin límite).
+# Los tokens se estiman por caracteres para no consultar la API de conteo en cada pregunta
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+
+# Cache de respuestas: capa exacta sobre la pregunta normalizada (0 entradas la desactiva) y capa semántica
+# opcional por similitud coseno del embedding de la pregunta (umbral 0 la desactiva)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("ANSWER_CACHE_SEMANTIC_THRESHOLD", "0"))
+
+SYSTEM_REWRITE = """Eres un asistente útil que genera subconsultas a partir de una sola pregunta del usuario.
+Descompón la pregunta original en partes más pequeñas y específicas, de modo que cada subconsulta capture un aspecto clave de la intención del usuario.
+Si existen varias formas comunes de formular cada parte o sinónimos relevantes, incluye dichas variantes en las subconsultas.
+Si hay siglas o palabras que no conoces, no intentes reformularlas."""
+
+PROMPT_REWRITE = ChatPromptTemplate.from_messages(
+    [
+        ("system", SYSTEM_REWRITE),
+        ("human", "{question}"),
+    ]
+)
+
+llm = ChatGoogleGenerativeAI(
+        model = "gemini-2.5-flash",
+        temperature = 0.5,
+    )
+
+llm_with_tools = llm.bind_tools([ParaphrasedQuery])
+query_analizer = PROMPT_REWRITE | llm_with_tools | PydanticToolsParser(tools = [ParaphrasedQuery])
+
+
+def load_vector_store(db_path: str, fresh: bool = False):
+    if not os.path.exists(db_path):
+        logger.warning(f"No se encontró la base de datos en {db_path}")
+        return None
+    if fresh:
+        return Chroma(
+            collection_name = "rag_docs",
+            client = open_fresh_client(db_path),
+            embedding_function = embeddings
+        )
+    return Chroma( 
+        collection_name = "rag_docs",
+        persist_directory = db_path,
+        embedding_function = embeddings
+    )
+
+
+def reload_vector_store(db_path: str):
+    return load_vector_store(db_path, fresh = True)
+
+
+def create_compression_retriever(vector_store, reranker, k = 15, search_type = "similarity"):
+    logger.info("Creando retriever base con search_type='%s' y k=%d", search_type, k)
+
+    search_kwargs = {"k": k}
+    if search_type == "mmr":
+        # MMR elige los k más diversos entre fetch_k candidatos; por defecto fetch_k=20 sería menor que k
+        search_kwargs["fetch_k"] = max(20, 2 * k)
+
+    retriever = vector_store.as_retriever(
+        search_type=search_type,
+        search_kwargs=search_kwargs
+    )
+
+    logger.info("Creando ContextualCompressionRetriever con reranker %s", reranker.__class__.__name__)
+
+    compression_retriever = ContextualCompressionRetriever(
+        base_compressor=reranker,
+        base_retriever=retriever
+    )
+
+    return compression_retriever
+
+
+class AgentRuntime:
+    """Estado de un agente: prompt, base vectorial, retriever y cache de respuestas."""
+
+    def __init__(self, agent_id: str, db_path: str, prompt_text: str, vector_store, retrieval_k: int = RETRIEVAL_K,
+                 rerank_top_n: int = RERANK_TOP_N, search_type: str = SEARCH_TYPE, score_threshold: float | None = SCORE_THRESHOLD):
+        self.agent_id = agent_id
+        self.db_path = db_path
+        self.prompt = ChatPromptTemplate.from_template(prompt_text)
+        self.vector_store = vector_store
+        # System de chromadb de este agente, para cerrarlo aunque una recarga lo haya sacado del cache
+        self.chroma_system = client_system(vector_store._client)
+        self.score_threshold = score_threshold
+
+        reranker = CrossEncoderReranker(model = hf_cross_encoder, top_n = rerank_top_n)
+        self.compression_retriever = create_compression_retriever(vector_store, reranker, k = retrieval_k, search_type = search_type)
+
+        # Se invalida sola cuando cambian los archivos de Chroma en db_path
+        self.answer_cache = AnswerCache(
+            db_path,
+            max_entries = ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds = ANSWER_CACHE_TTL_SECONDS,
+            semantic_threshold = ANSWER_CACHE_SEMANTIC_THRESHOLD,
+            embed_fn = embeddings.embed_query
+        )
+
+        if score_threshold is not None and RERANK_MODE == "per_query":
+            logger.warning("SCORE_THRESHOLD solo se aplica con RERANK_MODE=union: el reranker por subconsulta no expone puntajes")
+
+
+    def close(self):
+        close_client(self.vector_store._client, self.chroma_system)
+
+
+def dedupe_documents(docs):
+    seen = set()
+    unique_docs = []
+    for doc in docs:
+        if doc.page_content not in seen:
+            seen.add(doc.page_content)
+            unique_docs.append(doc)
+    return unique_docs
+
+
+def rerank_documents(question: str, docs, top_n: int):
+    if not docs:
+        return []
+
+    # Un solo llamado batched al cross-encoder con los pares (pregunta, chunk)
+    scores = hf_cross_encoder.score([(question, doc.page_content) for doc in docs])
+    for doc, score in zip(docs, scores):
+        doc.metadata["relevance_score"] = float(score)
+
+    return sorted(docs, key = lambda doc: doc.metadata["relevance_score"], reverse = True)[:top_n]
+
+
+def search_by_vector(retriever, vector):
+    # Misma búsqueda que hace el retriever, pero con el vector de la consulta ya calculado
+    if retriever.search_type == "mmr":
+        return retriever.vectorstore.max_marginal_relevance_search_by_vector(vector, **retriever.search_kwargs)
+    return retriever.vectorstore.similarity_search_by_vector(vector, **retriever.search_kwargs)
+
+
+def retrieve_candidates(all_queries, compression_retriever):
+    if not all_queries:
+        return []
+
+    # Las subconsultas se recuperan en paralelo: la latencia la marca la más lenta, no la suma
+    if RERANK_MODE == "per_query":
+        contexts = []
+        for docs in retrieval_executor.map(compression_retriever.invoke, all_queries):
+            contexts = contexts + docs
+        return contexts
+
+    base_retriever = compression_retriever.base_retriever
+    if BATCH_QUERY_EMBEDDING and base_retriever.search_type in ("similarity", "mmr"):
+        vectors = embeddings.embed_documents(list(all_queries))
+        results = retrieval_executor.map(lambda vector: search_by_vector(base_retriever, vector), vectors)
+    else:
+        results = retrieval_executor.map(base_retriever.invoke, all_queries)
+
+    candidates = []
+    for docs in results:
+        candidates = candidates + docs
+    return candidates
+
+
+def retrieve_contexts(question: str, all_queries, agent: AgentRuntime, candidates = ()):
+    # candidates: documentos ya recuperados para otras consultas de la misma pregunta
+    compression_retriever = agent.compression_retriever
+    candidates = dedupe_documents(list(candidates) + retrieve_candidates(all_queries, compression_retriever))
+    if RERANK_MODE == "per_query":
+        return candidates
+
+    logger.info("Candidatos unicos antes del rerank: %d", len(candidates))
+
+    contexts = rerank_documents(question, candidates, compression_retriever.base_compressor.top_n)
+    if agent.score_threshold is not None:
+        contexts = [doc for doc in contexts if doc.metadata["relevance_score"] >= agent.score_threshold]
+        logger.info("Documentos sobre el umbral %.2f: %d", agent.score_threshold, len(contexts))
+    return contexts
+
+
+def should_decompose(question: str) -> bool:
+    if QUERY_DECOMPOSITION == "always":
+        return True
+    if QUERY_DECOMPOSITION == "never":
+        return False
+
+    text = f" {question.casefold()} "
+    return (
+        len(question.split()) >= DECOMPOSE_MIN_WORDS
+        or question.count("?") > 1
+        or any(marker in text for marker in MULTI_PART_MARKERS)
+    )
+
+
+async def decompose_question(question: str) -> list[str]:
+    queries = await query_analizer.ainvoke({"question":question})
+    subqueries = [query.paraphrased_query for query in queries]
+    for query in subqueries:
+        logger.info("Subconsulta: %s", query)
+    return subqueries
+
+
+async def gather_contexts(question: str, agent: AgentRuntime):
+    # Embeddings, búsqueda y cross-encoder son CPU: corren en un hilo para no bloquear el event loop
+    if not should_decompose(question):
+        logger.info("Pregunta simple: se omite la descomposición")
+        return await anyio.to_thread.run_sync(retrieve_contexts, question, [question], agent)
+
+    if not DECOMPOSE_IN_PARALLEL:
+        subqueries = await decompose_question(question)
+        return await anyio.to_thread.run_sync(retrieve_contexts, question, subqueries + [question], agent)
+
+    # La pregunta original se recupera mientras Gemini genera las subconsultas; luego se reordena todo junto
+    original, subqueries = await asyncio.gather(
+        anyio.to_thread.run_sync(retrieve_candidates, [question], agent.compression_retriever),
+        decompose_question(question)
+    )
+    return await anyio.to_thread.run_sync(retrieve_contexts, question, subqueries, agent, original)
+
+
+async def prepare_rag(question: str, agent: AgentRuntime):
+    logger.info("=== Nueva pregunta RAG (agente %s) ===", agent.agent_id)
+    logger.info("Pregunta: %s", question)
+
+    contexts = await gather_contexts(question, agent)
+
+    logger.info("Documentos unicos recuperados: %d", len(contexts))
+
+    for i, doc in enumerate(contexts, start=1):
+        score = doc.metadata.get("relevance_score", "N/A")
+        snippet = doc.page_content[:200].replace("\n", " ")
+        logger.info("Doc #%d (score=%s, source=%s): %s...", 
+                    i, score, doc.metadata.get("source_file", "unknown"), snippet)
+
+    for i, doc in enumerate(contexts, start=1):
+        snippet = doc.page_content[:200].replace("\n", " ")
+        logger.debug("Doc #%d (source=%s): %s...", 
+                     i, doc.metadata.get("source_file", "unknown"), snippet)
+
+    # Construir contexto: chunks por relevancia hasta el presupuesto, uniendo los consecutivos de un mismo archivo
+    packed = pack_context(contexts, CONTEXT_TOKEN_BUDGET, CONTEXT_CHARS_PER_TOKEN)
+    logger.info(
+        "Contexto empaquetado: %d bloques, %d chunks (%d descartados), ~%d tokens de %d",
+        len(packed.blocks), len(packed.docs), packed.dropped, packed.tokens, CONTEXT_TOKEN_BUDGET
+    )
+
+    messages = agent.prompt.invoke({
+        "question": question,
+        "context": packed.text
+    })
+    return packed, messages
+
+
+def document_sources(packed) -> list[str]:
+    return [doc.metadata.get("source_file", "unknown") for doc in packed.docs]
+
+
+async def ask_rag(question: str, agent: AgentRuntime):
+    packed, messages = await prepare_rag(question, agent)
+    response = await llm.ainvoke(messages)
+
+    logger.info("Respuesta generada con longitud %d caracteres", len(response.content))
+
+    return {
+        "question": question,
+        "answer": response.content,
+        "sources": document_sources(packed),
+        "context_tokens": packed.tokens
+    }
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii = False)}\n\n"
+
+
+def chunk_text(content) -> str:
+    # Gemini puede devolver el contenido como texto o como lista de partes
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+async def lookup_answer(question: str, agent: AgentRuntime):
+    answer_cache = agent.answer_cache
+    if not answer_cache.enabled:
+        return None, None
+    # La capa semántica embebe la pregunta: se hace en un hilo para no bloquear el event loop
+    if answer_cache.semantic:
+        cached, probe = await anyio.to_thread.run_sync(answer_cache.lookup, question)
+    else:
+        cached, probe = answer_cache.lookup(question)
+    if cached is not None:
+        logger.info("Respuesta servida desde cache: %s", answer_cache.stats())
+    return cached, probe
+
+
+def store_answer(agent: AgentRuntime, probe, result: dict):
+    if probe is not None:
+        agent.answer_cache.store(probe, result)
+
+
+async def stream_cached(question: str, cached: dict):
+    yield sse_event("sources", {"question": question, "sources": cached["sources"], "context_tokens": cached.get("context_tokens")})
+    yield sse_event("token", {"text": cached["answer"]})
+    yield sse_event("done", {})
+
+
+async def stream_rag(question: str, agent: AgentRuntime, probe = None):
+    # Corre con un cupo de ask_slots que answer_stream tomó antes de devolver la respuesta
+    try:
+        packed, messages = await prepare_rag(question, agent)
+        sources = document_sources(packed)
+        yield sse_event("sources", {"question": question, "sources": sources, "context_tokens": packed.tokens})
+
+        parts = []
+        async for chunk in llm.astream(messages):
+            text = chunk_text(chunk.content)
+            if text:
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+
+        answer = "".join(parts)
+        logger.info("Respuesta transmitida con longitud %d caracteres", len(answer))
+        store_answer(agent, probe, {"question": question, "answer": answer, "sources": sources, "context_tokens": packed.tokens})
+        yield sse_event("done", {})
+    except Exception as e:
+        logger.exception("Error transmitiendo la respuesta")
+        yield sse_event("error", {"detail": str(e)})
+
+
+class AskRequest(BaseModel):
+    question: str
+
+
+# Compartido por todos los agentes del proceso
+ask_slots = asyncio.Semaphore(MAX_IN_FLIGHT_ASKS)
+
+
+def check_ask_available():
+    if ask_slots.locked():
+        logger.warning("Limite de %d preguntas en curso alcanzado, respondiendo 503", MAX_IN_FLIGHT_ASKS)
+        raise HTTPException(
+            status_code = 503,
+            detail = "El agente está atendiendo demasiadas preguntas, intenta de nuevo en unos segundos",
+            headers = {"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+
+async def answer(question: str, agent: AgentRuntime) -> dict:
+    # Las respuestas en cache no ocupan cupo ni cuentan para el límite de preguntas en curso
+    cached, probe = await lookup_answer(question, agent)
+    if cached is not None:
+        return {**cached, "question": question}
+
+    check_ask_available()
+    async with ask_slots:
+        try:
+            result = await ask_rag(question, agent)
+        except Exception as e:
+            raise HTTPException(status_code = 500, detail = str(e))
+    store_answer(agent, probe, result)
+    return result
+
+
+async def closing(body, on_close):
+    try:
+        async for event in body:
+            yield event
+    finally:
+        on_close()
+
+
+def release_once(release):
+    released = False
+
+    def wrapper():
+        nonlocal released
+        if not released:
+            released = True
+            release()
+    return wrapper
+
+
+async def answer_stream(question: str, agent: AgentRuntime, on_close = None) -> StreamingResponse:
+    closers = [on_close] if on_close is not None else []
+
+    cached, probe = await lookup_answer(question, agent)
+    if cached is not None:
+        body = stream_cached(question, cached)
+    else:
+        # El cupo se toma aquí y no al empezar a iterar: así una ráfaga de streams recibe 503 en lugar
+        # de encolarse en el semáforo. Con cupo libre acquire no espera
+        check_ask_available()
+        await ask_slots.acquire()
+        closers.append(release_once(ask_slots.release))
+        body = stream_rag(question, agent, probe)
+
+    # Los cierres corren al terminar el stream y también como tarea de fondo, por si el cliente se va
+    # antes de empezar y el generador nunca llega a su finally. Deben tolerar ser llamados dos veces
+    def close():
+        for closer in closers:
+            closer()
+
+    try:
+        if closers:
+            body = closing(body, close)
+
+        # Fuentes primero y luego los tokens de Gemini como Server-Sent Events.
+        # no-transform y X-Accel-Buffering evitan que la compresión o nginx-proxy acumulen el stream
+        return StreamingResponse(
+            body,
+            media_type = "text/event-stream",
+            headers = {"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"},
+            background = BackgroundTask(close) if closers else None
+        )
+    except Exception:
+        close()
+        raise
@@ -0,0 +1,77 @@
+from rag import AgentRuntime, AskRequest, answer, answer_stream, load_vector_store, reload_vector_store, logger
+from agent_registry import AgentRegistry, AgentNotFoundError
+from chroma_systems import ReloadUnsupportedError
+from fastapi import FastAPI, HTTPException, Header
+import secrets
+import anyio
+import os
+
+# Servidor multi-agente: los modelos se cargan una sola vez y la base de cada agente se abre
+# bajo demanda, así la memoria crece con los agentes activos y no con los desplegados.
+# Se levanta con la imagen agent-base: uvicorn tenant_server:app --host 0.0.0.0 --port 8000
+
+AGENTS_DATABASES_DIR = os.getenv("AGENTS_DATABASES_DIR", "/app/databases")
+AGENTS_PROMPTS_DIR = os.getenv("AGENTS_PROMPTS_DIR", "/app/prompts")
+# Agentes con la base abierta a la vez; el menos usado se cierra al abrir uno nuevo
+MAX_OPEN_AGENTS = int(os.getenv("MAX_OPEN_AGENTS", "32"))
+# Token de /agents/{id}/reload, el mismo de los contenedores del worker de deploy; sin valor queda deshabilitado
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or os.getenv("AGENT_POOL_ADMIN_TOKEN", "")
+
+app = FastAPI()
+
+registry = AgentRegistry(AGENTS_DATABASES_DIR, AGENTS_PROMPTS_DIR, MAX_OPEN_AGENTS, AgentRuntime, load_vector_store)
+
+
+async def acquire_agent(agent_id: str):
+    # Abrir Chroma lee disco: se hace en un hilo para no bloquear el event loop
+    try:
+        return await anyio.to_thread.run_sync(registry.acquire, agent_id)
+    except AgentNotFoundError:
+        raise HTTPException(status_code = 404, detail = f"No existe un agente desplegado con id {agent_id}")
+
+
+@app.post("/agents/{agent_id}/ask")
+async def ask(agent_id: str, req: AskRequest):
+    lease = await acquire_agent(agent_id)
+    try:
+        return await answer(req.question, lease.runtime)
+    finally:
+        lease.release()
+
+
+@app.post("/agents/{agent_id}/ask/stream")
+async def ask_stream(agent_id: str, req: AskRequest):
+    lease = await acquire_agent(agent_id)
+    try:
+        # El agente se libera cuando termina el stream, no al devolver la respuesta
+        return await answer_stream(req.question, lease.runtime, on_close = lease.release)
+    except Exception:
+        lease.release()
+        raise
+
+
+@app.post("/agents/{agent_id}/reload")
+async def reload(agent_id: str, x_admin_token: str = Header(default = "")):
+    # El worker de deploy la llama cuando el vectorizador terminó recursos nuevos de un agente
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code = 403, detail = "Forbidden")
+    try:
+        reloaded = await anyio.to_thread.run_sync(registry.reload, agent_id, reload_vector_store)
+    except AgentNotFoundError:
+        raise HTTPException(status_code = 404, detail = f"No existe un agente desplegado con id {agent_id}")
+    except ReloadUnsupportedError as e:
+        # Sin recarga en caliente se cierra el agente y la próxima pregunta lo abre desde disco
+        logger.warning("%s; se cierra el agente %s", e, agent_id)
+        return {"agent_id": agent_id, "status": "evicted" if registry.evict(agent_id) else "not_open"}
+    return {"agent_id": agent_id, "status": "reloaded" if reloaded else "not_open"}
+
+
+@app.on_event("shutdown")
+def shutdown():
+    registry.close_all()
+
+
+@app.get("/")
+def root():
+    logger.info("Agentes abiertos: %s", registry.stats())
+    return {"message": "Servidor multi-agente RAG corriendo 🚀", **registry.stats()}
@@ -1,6 +1,9 @@
+from agent_pool import AgentPool, POOL_LABEL, docker, http_json
+from functools import partial
 from rabbitmq import RabbitMQ   
 import logging
 import subprocess
+import secrets
 import json
 import os
 import asyncio
@@ -10,9 +13,116 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(me
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 BASE_PATH = os.getenv("BASE_PATH")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+
+# Contenedores agent-base precalentados (0 desactiva el pool y cada deploy hace docker run en frío).
+# No montan datos: al asociarlos se les copia solo la base y el prompt de su agente
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "0"))
+AGENT_POOL_ATTACH_TIMEOUT = float(os.getenv("AGENT_POOL_ATTACH_TIMEOUT", "60"))
+# Token de /admin/attach y /admin/reload de los agentes; sin valor se genera uno por ejecución
+AGENT_POOL_ADMIN_TOKEN = os.getenv("AGENT_POOL_ADMIN_TOKEN") or secrets.token_hex(16)
+NETWORK = "project_1_default"
+# nginx-proxy enruta los agentes del pool con un archivo por agente en su conf.d (volumen compartido)
+NGINX_ROUTES_DIR = os.getenv("NGINX_ROUTES_DIR", "/app/nginx-routes")
+NGINX_PROXY_CONTAINER = os.getenv("NGINX_PROXY_CONTAINER", "nginx-proxy")
+# Servidor multi-agente (perfil multitenant, p. ej. http://agent-server:8000); vacío si no se usa
+AGENT_SERVER_URL = os.getenv("AGENT_SERVER_URL", "")
 
 rabbitmq = RabbitMQ()
 
+agent_pool = AgentPool(
+    size = AGENT_POOL_SIZE,
+    image = "agent-base",
+    network = NETWORK,
+    admin_token = AGENT_POOL_ADMIN_TOKEN,
+    run_args = [
+        "-e", f"GOOGLE_API_KEY={GOOGLE_API_KEY}",
+        "-e", f"EMBEDDING_BACKEND={EMBEDDING_BACKEND}",
+    ],
+    attach_timeout = AGENT_POOL_ATTACH_TIMEOUT,
+    databases_dir = "/app/databases",
+    prompts_dir = "/app/prompts",
+    routes_dir = NGINX_ROUTES_DIR,
+    proxy_container = NGINX_PROXY_CONTAINER
+)
+
+# Ajustes de recuperación por agente que el backend guarda junto al prompt, como variables del contenedor
+RETRIEVAL_ENV = {
+    "retrieval_k": "RETRIEVAL_K",
+    "rerank_top_n": "RERANK_TOP_N",
+    "search_type": "SEARCH_TYPE",
+    "score_threshold": "SCORE_THRESHOLD",
+}
+
+
+async def load_retrieval_settings(agent_id: str) -> dict | None:
+    settings_path = f"/app/prompts/{agent_id}/retrieval.json"
+    if not os.path.exists(settings_path):
+        logging.info(f"No retrieval settings for agent {agent_id}, using template defaults")
+        return None
+
+    async with await anyio.open_file(settings_path, "r") as f:
+        settings = json.loads(await f.read())
+    return {key: settings.get(key) for key in RETRIEVAL_ENV}
+
+
+async def load_retrieval_env(agent_id: str) -> list[str]:
+    settings = await load_retrieval_settings(agent_id)
+    if settings is None:
+        return []
+
+    env = []
+    for key, name in RETRIEVAL_ENV.items():
+        if settings.get(key) is not None:
+            env += ["-e", f"{name}={settings[key]}"]
+    return env
+
+
+async def container_state(container_name: str) -> tuple[str | None, bool]:
+    # Estado del contenedor (None si no existe) y si viene del pool
+    code, output = await docker(
+        "ps", "-a", "--filter", f"name=^/{container_name}$", "--format", "{{.State}} {{.Labels}}"
+    )
+    if code != 0 or not output:
+        return None, False
+    state, _, labels = output.partition(" ")
+    return state, POOL_LABEL in labels.split(",")
+
+
+async def reload_agent(agent_id: str, container_name: str, pooled: bool) -> bool:
+    # El agente ya desplegado vuelve a abrir su base sin reiniciar el contenedor ni recargar los modelos.
+    # Los del pool tienen una copia privada de la base (con retrieval.json): se les copia una nueva antes de recargar.
+    # Los demás recibieron los ajustes como variables en docker run, así que los actuales van en el body
+    try:
+        if pooled:
+            await agent_pool.refresh(agent_id, container_name)
+        else:
+            settings = await load_retrieval_settings(agent_id)
+            reload = partial(
+                http_json, "POST", f"http://{container_name}:8000/admin/reload",
+                {"settings": settings} if settings is not None else None,
+                {"X-Admin-Token": AGENT_POOL_ADMIN_TOKEN}, AGENT_POOL_ATTACH_TIMEOUT
+            )
+            await anyio.to_thread.run_sync(reload)
+    except Exception as e:
+        logging.warning(f"Could not reload agent {agent_id} in {container_name}: {e}")
+        return False
+    logging.info(f"Agent {agent_id} reloaded its vector database in {container_name}")
+    return True
+
+
+async def reload_agent_server(agent_id: str):
+    # El servidor multi-agente recarga el agente si lo tiene abierto; si no, lo abrirá desde disco
+    reload = partial(
+        http_json, "POST", f"{AGENT_SERVER_URL}/agents/{agent_id}/reload",
+        None, {"X-Admin-Token": AGENT_POOL_ADMIN_TOKEN}, AGENT_POOL_ATTACH_TIMEOUT
+    )
+    try:
+        result = await anyio.to_thread.run_sync(reload)
+        logging.info(f"Agent server answered {result.get('status')} for agent {agent_id}")
+    except Exception as e:
+        logging.warning(f"Could not reload agent {agent_id} in the agent server: {e}")
+
 
 async def callback(message):
     try:
@@ -24,6 +134,35 @@ async def callback(message):
 
         image_name = "agent-base"
         container_name = f"agent_{agent_id}"
+
+        # Con el servidor multi-agente no hay un contenedor por agente: basta con que recargue (o abra) el agente
+        if AGENT_SERVER_URL:
+            await reload_agent_server(agent_id)
+            return
+
+        # Recursos nuevos de un agente ya desplegado: se recarga su base en el contenedor que está corriendo.
+        # Si no responde (o es de una ejecución anterior con otro token) o está detenido, se reemplaza
+        state, pooled = await container_state(container_name)
+        if payload.get("event") == "settings_updated" and state != "running":
+            # El backend cambió los ajustes de recuperación de un agente que no está corriendo:
+            # los lee de retrieval.json cuando se despliegue
+            logging.info(f"Agent {agent_id} is not running, its new settings apply on its next deploy")
+            return
+        if state == "running" and await reload_agent(agent_id, container_name, pooled):
+            return
+        if state is not None:
+            await docker("rm", "-f", container_name)
+            await agent_pool.remove_route(container_name)
+            logging.info(f"Removed {state} container {container_name} before redeploying agent {agent_id}")
+
+        # Con pool, el agente queda disponible en segundos: el contenedor ya tiene los modelos cargados
+        if AGENT_POOL_SIZE > 0:
+            claimed = await agent_pool.claim(agent_id, container_name)
+            agent_pool.refill()
+            if claimed:
+                logging.info(f"Agent {agent_id} deployed from the warm pool as {container_name}")
+                return
+            logging.info(f"No warm container available for agent {agent_id}, starting a new one")
         
         host_path = BASE_PATH + agent_id
         container_path = "/app/database"
@@ -36,24 +175,28 @@ async def callback(message):
         async with await anyio.open_file(prompt_path, "r") as f:
             PROMPT += await f.read()
 
-        await asyncio.create_subprocess_exec(
-            "docker", 
+        retrieval_env = await load_retrieval_env(agent_id)
+
+        code, _ = await docker(
             "run", 
             "-d", 
             "--name", container_name, 
-            "--network", "project_1_default",
+            "--network", NETWORK,
             "-e", f"AGENT_ID={agent_id}", 
             "-e", f"GOOGLE_API_KEY={GOOGLE_API_KEY}", 
             "-e", f"PROMPT={PROMPT}",
+            "-e", f"EMBEDDING_BACKEND={EMBEDDING_BACKEND}",
+            "-e", f"ADMIN_TOKEN={AGENT_POOL_ADMIN_TOKEN}",
+            *retrieval_env,
             "-e", f"VIRTUAL_HOST={container_name}",
             "-e", f"VIRTUAL_PORT={container_port}",
             "-p", f"{host_port}:{container_port}", 
             "-v", f"{host_path}:{container_path}", 
             image_name,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,)
-        
-        
+        )
+        if code != 0:
+            logging.error(f"Could not start container {container_name} for agent {agent_id}")
+            return
 
         logging.info(f"Agent deployed in http://localhost:{host_port} with ID {agent_id}")
 
@@ -63,7 +206,16 @@ async def callback(message):
 
 # Main async
 async def main():
-    await rabbitmq.consume("deploy", callback)
+    # El servidor multi-agente valida /agents/{id}/reload con el mismo token: uno aleatorio nunca coincidiría
+    if AGENT_SERVER_URL and not os.getenv("AGENT_POOL_ADMIN_TOKEN"):
+        raise RuntimeError("AGENT_POOL_ADMIN_TOKEN must be set when AGENT_SERVER_URL is set")
+
+    if AGENT_POOL_SIZE > 0:
+        await agent_pool.reset()
+        logging.info(f"Warm pool of {AGENT_POOL_SIZE} agent containers started")
+
+    # Uno a la vez sin importar RABBITMQ_MAX_CONCURRENCY: dos mensajes del mismo agente harían rm/claim/run sobre el mismo agent_<id>
+    await rabbitmq.consume("deploy", callback, max_concurrency = 1)
 
 
 if __name__ == "__main__":
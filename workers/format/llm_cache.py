@@ -0,0 +1,100 @@
+import threading
+import hashlib
+import logging
+import sqlite3
+import time
+import os
+
+
+class LLMCache:
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+        self.conn = sqlite3.connect(path, check_same_thread = False, isolation_level = None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        logging.info(f"LLM cache opened at {path} (max {max_bytes} bytes)")
+
+
+    @staticmethod
+    def make_key(system_prompt: str, chunk_text: str, model: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model, system_prompt, chunk_text):
+            encoded = part.encode("utf-8")
+            # Prefijo de longitud para que ("ab", "c") y ("a", "bc") no colisionen
+            digest.update(len(encoded).to_bytes(8, "big"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+
+    def put(self, key: str, response: str):
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time())
+            )
+            self._evict()
+
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Elimina las entradas menos usadas recientemente hasta volver bajo el límite
+        stale = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.evictions += len(stale)
+
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
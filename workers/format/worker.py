@@ -1,3 +1,4 @@
+from llm_cache import LLMCache
 from openai import AzureOpenAI
 from rabbitmq import RabbitMQ
 import logging
@@ -20,6 +21,15 @@ client = AzureOpenAI(
 
 rabbitmq = RabbitMQ()
 
+MODEL_NAME = "gpt-5-nano-iau-ingenieria"
+
+FORMAT_CACHE_PATH = os.getenv("FORMAT_CACHE_PATH", "cache/llm_cache.sqlite3")
+FORMAT_CACHE_MAX_MB = int(os.getenv("FORMAT_CACHE_MAX_MB", "512"))
+llm_cache = LLMCache(FORMAT_CACHE_PATH, FORMAT_CACHE_MAX_MB * 1024 * 1024) if FORMAT_CACHE_PATH else None
+
+FORMAT_CONCURRENCY = int(os.getenv("FORMAT_CONCURRENCY", "4"))
+FORMAT_CHUNK_TIMEOUT = float(os.getenv("FORMAT_CHUNK_TIMEOUT", "180"))
+
 async def load_text(path: str) -> str:
     async with await anyio.open_file(path, "r", encoding="utf-8") as f:
         return await f.read()
@@ -72,6 +82,14 @@ SAFE_WRAPPER = (
 )
 
 async def format_chunk(system_prompt: str, chunk_text: str, idx: int, total: int) -> str:
+    cache_key = None
+    if llm_cache is not None:
+        cache_key = LLMCache.make_key(system_prompt, chunk_text, MODEL_NAME)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            logging.info(f"Chunk {idx+1}/{total} servido desde caché")
+            return cached
+
     user_prompt = (
         f"Fragmento {idx+1}/{total}\n"
         "Convierte únicamente este fragmento a Markdown claro en español. No agregues información nueva. "
@@ -81,7 +99,7 @@ async def format_chunk(system_prompt: str, chunk_text: str, idx: int, total: int
 
     def _sync():
         return client.chat.completions.create(
-            model="gpt-5-nano-iau-ingenieria",
+            model=MODEL_NAME,
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
@@ -89,8 +107,15 @@ async def format_chunk(system_prompt: str, chunk_text: str, idx: int, total: int
         )
 
     try:
-        resp = await anyio.to_thread.run_sync(_sync)
-        return resp.choices[0].message.content or ""
+        with anyio.fail_after(FORMAT_CHUNK_TIMEOUT):
+            resp = await anyio.to_thread.run_sync(_sync, abandon_on_cancel = True)
+        content = resp.choices[0].message.content or ""
+        if cache_key is not None and content:
+            llm_cache.put(cache_key, content)
+        return content
+    except TimeoutError:
+        logging.error(f"Chunk {idx+1}/{total} excedió el tiempo límite de {FORMAT_CHUNK_TIMEOUT}s")
+        return chunk_text
     except Exception as e:
         logging.error(f"Chunk {idx+1}/{total} falló: {e}")
         return chunk_text  
@@ -98,12 +123,23 @@ async def format_chunk(system_prompt: str, chunk_text: str, idx: int, total: int
 async def format_large_markdown(markdown_path: str, system_prompt: str) -> str:
     chunks = await chunk_markdown_lines(markdown_path)
     total = len(chunks)
-    logging.info(f"Processing {total} chunks sequentally...")
+    concurrency = max(1, FORMAT_CONCURRENCY)
+    logging.info(f"Processing {total} chunks with concurrency {concurrency}...")
+
+    # Cada resultado se guarda en su posición original para reensamblar en orden
+    results: List[str] = [""] * total
+    limiter = anyio.Semaphore(concurrency)
+
+    async def _format_at(i: int, ch: str):
+        async with limiter:
+            results[i] = await format_chunk(system_prompt, ch, i, total)
+
+    async with anyio.create_task_group() as tg:
+        for i, ch in enumerate(chunks):
+            tg.start_soon(_format_at, i, ch)
 
-    results = []
-    for i, ch in enumerate(chunks):
-        formatted = await format_chunk(system_prompt, ch, i, total)
-        results.append(formatted)
+    if llm_cache is not None:
+        logging.info(f"LLM cache stats: {llm_cache.stats()}")
 
     return "\n".join(results)
 
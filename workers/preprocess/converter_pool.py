@@ -0,0 +1,99 @@
+from markitdown import MarkItDown
+import multiprocessing
+import logging
+import asyncio
+import anyio
+
+
+class ConversionError(Exception):
+    pass
+
+
+def serve(connection):
+    # Cada proceso crea su MarkItDown una sola vez y convierte un archivo a la vez
+    converter = MarkItDown(enable_plugins = True) # Set to True to enable plugins
+    while True:
+        filepath = connection.recv()
+        if filepath is None:
+            break
+        try:
+            connection.send((True, converter.convert(filepath).text_content))
+        except Exception as e:
+            connection.send((False, f"{type(e).__name__}: {e}"))
+
+
+class ConverterProcess:
+
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target = serve, args = (child,), daemon = True)
+        self.process.start()
+        child.close()
+
+
+    def convert(self, filepath: str, timeout: float) -> str:
+        # Bloqueante: se llama desde un hilo
+        self.connection.send(filepath)
+        if not self.connection.poll(timeout):
+            raise TimeoutError(f"Conversion of {filepath} exceeded {timeout}s")
+        ok, result = self.connection.recv()
+        if not ok:
+            raise ConversionError(result)
+        return result
+
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout = 5)
+        self.kill()
+
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class ConverterPool:
+    """Procesos de conversión con MarkItDown ya cargado; un archivo colgado solo mata su propio proceso."""
+
+    def __init__(self, size: int, timeout: float):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.idle: asyncio.Queue[ConverterProcess] = asyncio.Queue()
+
+
+    async def start(self):
+        logging.info(f"Starting conversion pool with {self.size} workers")
+        for _ in range(self.size):
+            self.idle.put_nowait(await anyio.to_thread.run_sync(ConverterProcess, self.context))
+
+
+    async def convert(self, filepath: str) -> str:
+        worker = await self.idle.get()
+        healthy = False
+        try:
+            text = await anyio.to_thread.run_sync(worker.convert, filepath, self.timeout)
+            healthy = True
+            return text
+        except ConversionError:
+            # MarkItDown falló con este archivo, pero el proceso sigue sirviendo
+            healthy = True
+            raise
+        finally:
+            if not healthy:
+                # Colgado o muerto: se reemplaza solo este proceso, las demás conversiones siguen
+                logging.error(f"Restarting converter process after failing on {filepath}")
+                worker.kill()
+                worker = await anyio.to_thread.run_sync(ConverterProcess, self.context)
+            self.idle.put_nowait(worker)
+
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get_nowait().stop()
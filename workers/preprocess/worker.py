@@ -1,4 +1,4 @@
-from markitdown import MarkItDown
+from converter_pool import ConverterPool
 from rabbitmq import RabbitMQ
 import json
 import logging
@@ -7,9 +7,18 @@ import asyncio
 import anyio
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
-md_converter = MarkItDown(enable_plugins = True) # Set to True to enable plugins
 rabbitmq = RabbitMQ()
 
+CONVERT_WORKERS = int(os.getenv("CONVERT_WORKERS", str(os.cpu_count() or 1)))
+CONVERT_TIMEOUT = float(os.getenv("CONVERT_TIMEOUT", "600"))
+
+# Un proceso por conversión en curso, con MarkItDown cargado una sola vez por proceso
+converter_pool: ConverterPool | None = None
+
+
+async def convert_to_markdown(filepath: str) -> str:
+    return await converter_pool.convert(filepath)
+
 async def callback(message):
     try:
         decoded_message = message.body.decode().strip()
@@ -27,8 +36,7 @@ async def callback(message):
         logging.info(f"Number of documents received: {total_docs}")
         
         # Convertir el contenido a Markdown
-        result = md_converter.convert(filepath)
-        markdown_text = result.text_content
+        markdown_text = await convert_to_markdown(filepath)
 
         # Extraer la ruta original del archivo
         original_path = filepath  
@@ -61,7 +69,13 @@ async def callback(message):
         
 
 async def main():
-    await rabbitmq.consume("files", callback)
+    global converter_pool
+    converter_pool = ConverterPool(CONVERT_WORKERS, CONVERT_TIMEOUT)
+    await converter_pool.start()
+    try:
+        await rabbitmq.consume("files", callback, max_concurrency = CONVERT_WORKERS)
+    finally:
+        converter_pool.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
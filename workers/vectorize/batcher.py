@@ -0,0 +1,80 @@
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+import logging
+import asyncio
+
+
+@dataclass
+class BatchItem:
+    db_id: str
+    chunks: list
+    payload: dict
+    future: asyncio.Future = field(repr = False)
+
+
+class MicroBatcher:
+
+    def __init__(self, flush_fn: Callable[[list[BatchItem]], Awaitable[Any]], window_ms: int, max_chunks: int):
+        self.flush_fn = flush_fn
+        self.window = window_ms / 1000
+        self.max_chunks = max_chunks
+
+        self.pending: list[BatchItem] = []
+        self.pending_chunks = 0
+        self.timer: asyncio.Task | None = None
+        self.flush_tasks: set[asyncio.Task] = set()
+        # Solo un flush a la vez: lo que llega mientras tanto forma el siguiente lote
+        self.flush_lock = asyncio.Lock()
+
+
+    async def submit(self, db_id: str, chunks: list, payload: dict):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(BatchItem(db_id, chunks, payload, future))
+        self.pending_chunks += len(chunks)
+
+        if self.pending_chunks >= self.max_chunks:
+            self._cancel_timer()
+            task = asyncio.create_task(self.flush())
+            self.flush_tasks.add(task)
+            task.add_done_callback(self.flush_tasks.discard)
+        elif self.timer is None:
+            self.timer = asyncio.create_task(self._flush_after_window())
+
+        # Se resuelve cuando los chunks de este mensaje quedaron persistidos
+        return await future
+
+
+    def _cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window)
+        self.timer = None
+        await self.flush()
+
+
+    async def flush(self):
+        async with self.flush_lock:
+            batch, self.pending = self.pending, []
+            self.pending_chunks = 0
+            if not batch:
+                return
+
+            logging.info(
+                f"Flushing batch of {len(batch)} messages "
+                f"({sum(len(item.chunks) for item in batch)} chunks, {len({item.db_id for item in batch})} databases)"
+            )
+            try:
+                await self.flush_fn(batch)
+            except Exception as e:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                return
+
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_result(None)
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import chromadb
+import logging
+import os
+
+
+class PooledCollection:
+
+    def __init__(self, db_id: str, client, collection):
+        self.db_id = db_id
+        self.client = client
+        self.collection = collection
+        self.max_batch_size = client.get_max_batch_size()
+        self.leases = 0
+        self.evicted = False
+
+
+class ChromaPool:
+
+    def __init__(self, base_dir: str, max_size: int, collection_name: str = "rag_docs"):
+        self.base_dir = base_dir
+        self.max_size = max(1, max_size)
+        self.collection_name = collection_name
+        self.entries: OrderedDict[str, PooledCollection] = OrderedDict()
+        self.lock = threading.Lock()
+
+
+    def _open(self, db_id: str) -> PooledCollection:
+        db_path = Path(self.base_dir) / db_id
+        os.makedirs(db_path, exist_ok = True)
+
+        # Misma colección que abre langchain_chroma en el agente, sin función de embedding propia
+        client = chromadb.PersistentClient(path = str(db_path))
+        collection = client.get_or_create_collection(name = self.collection_name, embedding_function = None)
+        logging.info(f"Opened vector database at {db_path}")
+        return PooledCollection(db_id, client, collection)
+
+
+    def _close(self, entry: PooledCollection):
+        # Client.close() solo existe en versiones recientes de chromadb
+        close = getattr(entry.client, "close", None)
+        if close is not None:
+            close()
+        logging.info(f"Closed vector database for {entry.db_id}")
+
+
+    @contextmanager
+    def lease(self, db_id: str):
+        with self.lock:
+            entry = self.entries.get(db_id)
+            if entry is None:
+                entry = self._open(db_id)
+                self.entries[db_id] = entry
+            self.entries.move_to_end(db_id)
+            entry.leases += 1
+
+            while len(self.entries) > self.max_size:
+                _, oldest = self.entries.popitem(last = False)
+                oldest.evicted = True
+                if oldest.leases == 0:
+                    self._close(oldest)
+
+        try:
+            yield entry
+        finally:
+            with self.lock:
+                entry.leases -= 1
+                # Una colección desalojada mientras se usaba se cierra al liberarla
+                if entry.evicted and entry.leases == 0:
+                    self._close(entry)
+
+
+    def close_all(self):
+        with self.lock:
+            for entry in self.entries.values():
+                entry.evicted = True
+                if entry.leases == 0:
+                    self._close(entry)
+            self.entries.clear()
@@ -0,0 +1,79 @@
+from encoder import build_embeddings
+from pathlib import Path
+import numpy as np
+import argparse
+import time
+
+# Compara los backends de embedding contra la línea base de PyTorch: throughput,
+# similitud coseno entre vectores y recall@k de los vecinos recuperados.
+# Uso: python embedding_benchmark.py --corpus ../../backend/data --backends onnx onnx-int8 --k 10
+
+
+def load_corpus(path: str, limit: int, chunk_chars: int) -> list[str]:
+    texts = []
+    for file in sorted(Path(path).rglob("*.md")):
+        content = file.read_text(encoding = "utf-8", errors = "ignore")
+        for start in range(0, len(content), chunk_chars):
+            chunk = content[start:start + chunk_chars].strip()
+            if chunk:
+                texts.append(chunk)
+            if len(texts) >= limit:
+                return texts
+    return texts
+
+
+def encode(backend: str, texts: list[str]) -> tuple[np.ndarray, float]:
+    embeddings = build_embeddings(backend)
+    embeddings.embed_documents(texts[:8])  # warm-up
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype = np.float32)
+    return vectors, time.perf_counter() - start
+
+
+def top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ corpus.T
+    return np.argsort(-scores, axis = 1)[:, :k]
+
+
+def recall_at_k(baseline: np.ndarray, candidate: np.ndarray) -> float:
+    hits = [len(set(b) & set(c)) / len(b) for b, c in zip(baseline, candidate)]
+    return float(np.mean(hits))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", required = True, help = "Directorio con archivos .md")
+    parser.add_argument("--backends", nargs = "+", default = ["onnx", "onnx-int8"])
+    parser.add_argument("--limit", type = int, default = 2000)
+    parser.add_argument("--chunk-chars", type = int, default = 700)
+    parser.add_argument("--queries", type = int, default = 200)
+    parser.add_argument("--k", type = int, default = 10)
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus, args.limit, args.chunk_chars)
+    if len(texts) <= args.k:
+        raise SystemExit(f"Corpus too small: {len(texts)} chunks")
+    print(f"Corpus: {len(texts)} chunks")
+
+    baseline, elapsed = encode("torch", texts)
+    print(f"{'torch':<10} {len(texts) / elapsed:8.1f} chunks/s")
+
+    # Las consultas son chunks del propio corpus, codificados con cada backend
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(len(texts), size = min(args.queries, len(texts)), replace = False)
+    baseline_top = top_k(baseline, baseline[query_ids], args.k)
+
+    for backend in args.backends:
+        vectors, elapsed = encode(backend, texts)
+        cosine = float(np.mean(np.sum(baseline * vectors, axis = 1)))
+        # Consultas del backend contra la colección existente (torch) y contra una colección re-indexada
+        mixed = recall_at_k(baseline_top, top_k(baseline, vectors[query_ids], args.k))
+        reindexed = recall_at_k(baseline_top, top_k(vectors, vectors[query_ids], args.k))
+        print(
+            f"{backend:<10} {len(texts) / elapsed:8.1f} chunks/s  cosine vs torch={cosine:.4f}  "
+            f"recall@{args.k} existing collection={mixed:.3f}  re-indexed={reindexed:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import numpy as np
+import threading
+import hashlib
+import logging
+import sqlite3
+import os
+
+# SQLite limita la cantidad de parámetros por consulta
+LOOKUP_BATCH = 500
+
+
+class EmbeddingCache:
+
+    def __init__(self, path: str, model_name: str, normalize: bool, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported embedding cache dtype: {dtype}")
+
+        self.path = path
+        self.model_name = model_name
+        self.normalize = int(normalize)
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+        self.conn = sqlite3.connect(path, check_same_thread = False, isolation_level = None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                normalize INTEGER NOT NULL,
+                text_hash TEXT NOT NULL,
+                dtype TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, normalize, text_hash)
+            )"""
+        )
+        logging.info(f"Embedding cache opened at {path} ({model_name}, normalize={bool(normalize)}, {dtype})")
+
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+    def get_many(self, hashes: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        with self.lock:
+            for start in range(0, len(hashes), LOOKUP_BATCH):
+                batch = hashes[start:start + LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, dtype, vector FROM embeddings "
+                    f"WHERE model = ? AND normalize = ? AND text_hash IN ({placeholders})",
+                    (self.model_name, self.normalize, *batch)
+                ).fetchall()
+                for text_hash, dtype, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype = dtype).astype(np.float32).tolist()
+        return found
+
+
+    def put_many(self, hashes: list[str], vectors: list[list[float]]):
+        rows = [
+            (self.model_name, self.normalize, text_hash, self.dtype.name, np.asarray(vector, dtype = self.dtype).tobytes())
+            for text_hash, vector in zip(hashes, vectors)
+        ]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, normalize, text_hash, dtype, vector) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.execute("COMMIT")
+
+
+    def embed(self, texts: list[str], embed_fn) -> list[list[float]]:
+        hashes = [self.text_hash(text) for text in texts]
+        cached = self.get_many(list(dict.fromkeys(hashes)))
+
+        # Textos repetidos dentro del mismo lote se codifican una sola vez
+        missing: dict[str, str] = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = embed_fn(list(missing.values()))
+            self.put_many(list(missing.keys()), computed)
+            cached.update(zip(missing.keys(), computed))
+
+        logging.info(f"Embedding cache: {len(texts) - len(missing)}/{len(texts)} chunks served from cache")
+        return [cached[text_hash] for text_hash in hashes]
+
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,54 @@
+from langchain_huggingface import HuggingFaceEmbeddings
+import threading
+import os
+
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+NORMALIZE_EMBEDDINGS = True
+
+# torch (por defecto), onnx u onnx-int8: el mismo modelo, así que los vectores son compatibles con las colecciones existentes
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_qint8_avx512_vnni.onnx"),
+}
+
+# El modelo se carga al primer uso: en modo proceso solo lo cargan los procesos del pool
+_embeddings: HuggingFaceEmbeddings | None = None
+_lock = threading.Lock()
+
+
+def embedding_model_kwargs(backend: str) -> dict:
+    if backend == "torch":
+        return {"device": "cpu"}
+    if backend not in ONNX_FILES:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+    return {"device": "cpu", "backend": "onnx", "model_kwargs": {"file_name": ONNX_FILES[backend]}}
+
+
+def embedding_model_key(backend: str = EMBEDDING_BACKEND) -> str:
+    # Identifica modelo y backend en la cache: los vectores int8 no se mezclan con los de torch
+    return EMBEDDING_MODEL if backend == "torch" else f"{EMBEDDING_MODEL}@{backend}"
+
+
+def build_embeddings(backend: str = EMBEDDING_BACKEND) -> HuggingFaceEmbeddings:
+    return HuggingFaceEmbeddings(
+        model_name = EMBEDDING_MODEL,
+        model_kwargs = embedding_model_kwargs(backend),
+        encode_kwargs = {"normalize_embeddings": NORMALIZE_EMBEDDINGS}
+    )
+
+
+def get_embeddings() -> HuggingFaceEmbeddings:
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            _embeddings = build_embeddings()
+    return _embeddings
+
+
+def init_encoder():
+    get_embeddings()
+
+
+def encode(texts: list[str]) -> list[list[float]]:
+    return get_embeddings().embed_documents(texts)
@@ -1,9 +1,14 @@
 from langchain.text_splitter import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from encoder import NORMALIZE_EMBEDDINGS, embedding_model_key, encode, init_encoder
 from langchain.schema import Document
+from embedding_cache import EmbeddingCache
+from chroma_pool import ChromaPool
+from batcher import MicroBatcher
 from rabbitmq import RabbitMQ
 from pathlib import Path
+import multiprocessing
+import hashlib
 import logging
 import os
 import json
@@ -20,6 +25,8 @@ markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on = headers_to_
 recursive_splitter = RecursiveCharacterTextSplitter(
     chunk_size = 700,       
 		chunk_overlap = 150,     
+		# start_index permite registrar cuánto repite cada chunk del anterior (ver overlap_chars)
+		add_start_index = True,
 		separators = [           
 			"\n\n",    
 			"\n",      
@@ -30,13 +37,34 @@ recursive_splitter = RecursiveCharacterTextSplitter(
 		]
 )
 
-embeddings = HuggingFaceEmbeddings(
-    model_name = "sentence-transformers/all-mpnet-base-v2",
-    model_kwargs = {"device": "cpu"},
-    encode_kwargs = {"normalize_embeddings": True}
+# Cache persistente de embeddings por hash del chunk (ruta vacía lo deshabilita)
+EMBEDDING_CACHE_PATH = os.getenv("VECTORIZE_EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3")
+EMBEDDING_CACHE_DTYPE = os.getenv("VECTORIZE_EMBEDDING_CACHE_DTYPE", "float32")
+embedding_cache = (
+    EmbeddingCache(EMBEDDING_CACHE_PATH, embedding_model_key(), NORMALIZE_EMBEDDINGS, EMBEDDING_CACHE_DTYPE)
+    if EMBEDDING_CACHE_PATH else None
 )
 
 BASE_DB_DIR = "databases"
+COLLECTION_NAME = "rag_docs"
+
+# Colecciones abiertas reutilizadas entre mensajes del mismo agente
+CHROMA_POOL_SIZE = int(os.getenv("VECTORIZE_CHROMA_POOL_SIZE", "16"))
+chroma_pool = ChromaPool(BASE_DB_DIR, CHROMA_POOL_SIZE, COLLECTION_NAME)
+
+# Micro-batching: chunks of several in-flight messages are embedded together (0 disables it)
+BATCH_WINDOW_MS = int(os.getenv("VECTORIZE_BATCH_WINDOW_MS", "300"))
+BATCH_MAX_CHUNKS = int(os.getenv("VECTORIZE_BATCH_MAX_CHUNKS", "2048"))
+MAX_IN_FLIGHT = int(os.getenv("VECTORIZE_MAX_IN_FLIGHT", "8"))
+
+# Embedding y escritura corren fuera del event loop para no perder heartbeats de RabbitMQ.
+# Con VECTORIZE_ENCODE_PROCESSES > 0 el encoder corre en procesos aparte en lugar del hilo de la etapa:
+# cada lote se parte entre los procesos (en trozos de al menos VECTORIZE_ENCODE_MIN_SHARD textos).
+STAGE_THREADS = int(os.getenv("VECTORIZE_STAGE_THREADS", "1"))
+ENCODE_PROCESSES = int(os.getenv("VECTORIZE_ENCODE_PROCESSES", "0"))
+ENCODE_MIN_SHARD = int(os.getenv("VECTORIZE_ENCODE_MIN_SHARD", "32"))
+stage_executor: ThreadPoolExecutor | None = None
+encode_executor: ProcessPoolExecutor | None = None
 
 
 async def chunk_file(file_path: str):
@@ -56,10 +84,17 @@ async def chunk_file(file_path: str):
     logging.info(f"{len(structured_chunks)} structured chunks generated from file {filename}")
     final_chunks = []
     for chunk in structured_chunks:
-        docs = recursive_splitter.split_text(chunk.page_content)
-        for doc in docs:
+        # Fin del chunk anterior en la sección; None si el splitter no pudo ubicarlo
+        previous_end = None
+        for position, doc in enumerate(recursive_splitter.create_documents([chunk.page_content])):
+            start = doc.metadata.pop("start_index", -1)
+            metadata = {}
+            if start >= 0 and (position == 0 or previous_end is not None):
+                # Caracteres que comparte con el final del chunk anterior; 0 al empezar una sección de headers
+                metadata["overlap_chars"] = max(0, previous_end - start) if position > 0 else 0
+            previous_end = start + len(doc.page_content) if start >= 0 else None
             final_chunks.append(
-                Document(page_content = doc)
+                Document(page_content = doc.page_content, metadata = metadata)
             )
 
     for i, chunk in enumerate(final_chunks):
@@ -69,36 +104,184 @@ async def chunk_file(file_path: str):
             "chunk_index": i,
             "total_chunks_in_doc": len(final_chunks),
             "chunking_strategy": "hybrid",
-            "chunk_size": len(chunk.page_content)
+            "chunk_size": len(chunk.page_content),
+            "content_hash": hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
         })
     
     return final_chunks
 
 
-def load_to_chromadb(db_id: str, chunks, collection_name = "rag_docs"):
+def chunk_id(chunk) -> str:
+    # ID estable: reprocesar el mismo archivo produce los mismos IDs y el upsert no duplica
+    metadata = chunk.metadata
+    key = f"{metadata['source_path']}\0{metadata['chunk_index']}\0{metadata['content_hash']}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ChunkPlan:
+
+    def __init__(self):
+        self.new_chunks = []
+        self.kept_ids: list[str] = []
+        self.kept_metadatas: list[dict] = []
+        self.stale_ids: list[str] = []
+
+
+def latest_by_source(chunks) -> dict[str, list]:
+    # Un archivo que llega dos veces (redelivery) trae dos series de chunk_index desde 0: se conserva la última
+    by_source: dict[str, list] = {}
+    for chunk in chunks:
+        source_path = chunk.metadata["source_path"]
+        if chunk.metadata["chunk_index"] == 0 or source_path not in by_source:
+            by_source[source_path] = []
+        by_source[source_path].append(chunk)
+    return by_source
+
+
+def plan_chunks(collection, chunks) -> ChunkPlan:
+    # Compara los chunks nuevos con los hashes ya guardados del mismo archivo:
+    # solo los chunks nuevos se codifican y solo los que ya no existen se eliminan
+    plan = ChunkPlan()
+    for source_path, source_chunks in latest_by_source(chunks).items():
+        stored = collection.get(where = {"source_path": source_path}, include = ["metadatas"])
+        available: dict[str, list[str]] = {}
+        for stored_id, metadata in zip(stored["ids"], stored["metadatas"]):
+            content_hash = (metadata or {}).get("content_hash")
+            if content_hash:
+                available.setdefault(content_hash, []).append(stored_id)
+            else:
+                plan.stale_ids.append(stored_id)
+
+        # Primero los chunks que no cambiaron de posición (mismo ID), luego los que solo se movieron;
+        # así el ID de un chunk nuevo nunca coincide con el de uno que se conserva
+        pending = []
+        for chunk in source_chunks:
+            matches = available.get(chunk.metadata["content_hash"], [])
+            same_id = chunk_id(chunk)
+            if same_id in matches:
+                matches.remove(same_id)
+                plan.kept_ids.append(same_id)
+                plan.kept_metadatas.append(chunk.metadata)
+            else:
+                pending.append(chunk)
+
+        for chunk in pending:
+            matches = available.get(chunk.metadata["content_hash"])
+            if matches:
+                plan.kept_ids.append(matches.pop())
+                plan.kept_metadatas.append(chunk.metadata)
+            else:
+                plan.new_chunks.append(chunk)
+
+        for ids in available.values():
+            plan.stale_ids.extend(ids)
+
+    return plan
+
+
+def shard_texts(texts: list[str], shards: int, min_size: int) -> list[list[str]]:
+    # Trozos contiguos y parejos: concatenar sus resultados conserva el orden de los textos
+    count = max(1, min(shards, len(texts) // max(1, min_size)))
+    size, extra = divmod(len(texts), count)
+    parts, start = [], 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        parts.append(texts[start:end])
+        start = end
+    return parts
+
+
+def encode_texts(texts: list[str]) -> list[list[float]]:
+    if encode_executor is None:
+        return encode(texts)
+    # Solo una etapa codifica a la vez (lock del batcher), así que el lote se reparte entre todos los procesos
+    futures = [encode_executor.submit(encode, part) for part in shard_texts(texts, ENCODE_PROCESSES, ENCODE_MIN_SHARD)]
+    vectors = []
+    for future in futures:
+        vectors.extend(future.result())
+    return vectors
+
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    if embedding_cache is None:
+        return encode_texts(texts)
+    return embedding_cache.embed(texts, encode_texts)
+
+
+async def run_in_stage(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(stage_executor, fn, *args)
+
+
+def load_to_chromadb(db_id: str, chunks):
+    load_groups_to_chromadb({db_id: chunks})
+    return str(Path(BASE_DB_DIR) / db_id)
+
+
+def write_plan(store, plan: ChunkPlan, vectors):
+    collection = store.collection
+    batch_size = store.max_batch_size
 
-    db_path =  Path(BASE_DB_DIR) / db_id
-    os.makedirs(db_path, exist_ok = True)
+    if plan.stale_ids:
+        for start in range(0, len(plan.stale_ids), batch_size):
+            collection.delete(ids = plan.stale_ids[start:start + batch_size])
 
-    if not any(db_path.iterdir()):
-        Chroma.from_documents(
-            collection_name = collection_name,
-            documents = chunks, 
-            embedding = embeddings,
-            persist_directory = str(db_path)
+    # Los chunks que no cambiaron conservan su vector, solo se actualizan posición y metadatos
+    for start in range(0, len(plan.kept_ids), batch_size):
+        collection.update(
+            ids = plan.kept_ids[start:start + batch_size],
+            metadatas = plan.kept_metadatas[start:start + batch_size]
         )
-        logging.info(f"Vector database created at {db_path}")
-    else:
-        db = Chroma(
-            collection_name = collection_name,
-            embedding_function = embeddings,
-            persist_directory = str(db_path)
+
+    ids = [chunk_id(chunk) for chunk in plan.new_chunks]
+    for start in range(0, len(plan.new_chunks), batch_size):
+        batch = plan.new_chunks[start:start + batch_size]
+        collection.upsert(
+            ids = ids[start:start + batch_size],
+            embeddings = vectors[start:start + batch_size],
+            documents = [chunk.page_content for chunk in batch],
+            metadatas = [chunk.metadata for chunk in batch]
         )
-        db.add_documents(chunks)
-        logging.info(f"Chunks added to existing vector database at {db_path}")
 
-    logging.info(f"Persistence completed at {db_path}")
-    return str(db_path)
+
+def load_groups_to_chromadb(groups: dict[str, list]):
+    plans: dict[str, ChunkPlan] = {}
+    for db_id, chunks in groups.items():
+        if not chunks:
+            continue
+        with chroma_pool.lease(db_id) as store:
+            plans[db_id] = plan_chunks(store.collection, chunks)
+
+    # Un solo llamado al encoder para los chunks nuevos de todo el lote
+    texts = [chunk.page_content for plan in plans.values() for chunk in plan.new_chunks]
+    vectors = embed_texts(texts) if texts else []
+    logging.info(f"Embedded {len(texts)} new chunks for {len(plans)} databases in one call")
+
+    offset = 0
+    for db_id, plan in plans.items():
+        with chroma_pool.lease(db_id) as store:
+            write_plan(store, plan, vectors[offset:offset + len(plan.new_chunks)])
+        offset += len(plan.new_chunks)
+
+        logging.info(
+            f"Vector database {db_id}: {len(plan.new_chunks)} chunks added, "
+            f"{len(plan.kept_ids)} unchanged, {len(plan.stale_ids)} removed"
+        )
+        logging.info(f"Persistence completed at {Path(BASE_DB_DIR) / db_id}")
+
+
+async def persist_batch(batch):
+    # Si un mismo archivo llega dos veces en el lote (redelivery), plan_chunks conserva la última versión
+    groups: dict[str, list] = {}
+    for item in batch:
+        groups.setdefault(item.db_id, []).extend(item.chunks)
+
+    await run_in_stage(load_groups_to_chromadb, groups)
+
+    await rabbitmq.publish_many([("control", json.dumps(item.payload)) for item in batch])
+    logging.info(f"Published {len(batch)} messages to control topic")
+
+
+batcher = MicroBatcher(persist_batch, BATCH_WINDOW_MS, BATCH_MAX_CHUNKS) if BATCH_WINDOW_MS > 0 else None
 
 
 async def callback(message):
@@ -120,26 +303,56 @@ async def callback(message):
         logging.info(f"Total docs received: {total_docs}")
 
         chunks = await chunk_file(file_path)
-        db_path = load_to_chromadb(db_id, chunks)
-
-        if db_path:
-
-            message = {
-                "agent_id": db_id, 
-                "total_docs": total_docs
-            } 
-
-            await rabbitmq.publish("control", json.dumps(message))
-            logging.info("Published message to control topic")
+        if chunks is None:
+            return
 
     except json.JSONDecodeError:
         logging.error("Failed to decode JSON message")
+        return
     except Exception as e:
         logging.error(f"Error processing message: {e}")
+        return
+
+    control_message = {
+        "agent_id": db_id, 
+        "total_docs": total_docs
+    } 
+
+    # Los fallos al persistir o publicar no se atrapan: consume hace nack y el mensaje se reencola.
+    # Reprocesarlo es seguro porque las escrituras son upserts con IDs deterministas
+    if batcher is not None:
+        # El mensaje se confirma solo cuando sus chunks quedaron persistidos
+        await batcher.submit(db_id, chunks, control_message)
+        return
+
+    db_path = await run_in_stage(load_to_chromadb, db_id, chunks)
+
+    if db_path:
+        await rabbitmq.publish("control", json.dumps(control_message))
+        logging.info("Published message to control topic")
 
 
 async def main():
-    await rabbitmq.consume("vectorize", callback)
+    global stage_executor, encode_executor
+    stage_executor = ThreadPoolExecutor(max_workers = STAGE_THREADS, thread_name_prefix = "vectorize-stage")
+    if ENCODE_PROCESSES > 0:
+        logging.info(f"Encoding in a pool of {ENCODE_PROCESSES} processes")
+        encode_executor = ProcessPoolExecutor(
+            max_workers = ENCODE_PROCESSES,
+            mp_context = multiprocessing.get_context("spawn"),
+            initializer = init_encoder
+        )
+    else:
+        init_encoder()
+
+    try:
+        # El semáforo del consumidor acota los mensajes en vuelo: es la contrapresión hacia RabbitMQ
+        await rabbitmq.consume("vectorize", callback, max_concurrency = MAX_IN_FLIGHT)
+    finally:
+        chroma_pool.close_all()
+        stage_executor.shutdown(wait = True)
+        if encode_executor is not None:
+            encode_executor.shutdown(cancel_futures = True)
 
 
 if __name__ == "__main__":